@@ -0,0 +1,1277 @@
+#!/usr/bin/env python
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+
+from onefuzztypes.enums import ContainerType, TaskType
+from onefuzztypes.models import (
+    Job,
+    JobConfig,
+    NotificationConfig,
+    Task,
+    TaskConfig,
+    TaskContainers,
+    TaskDetails,
+    TaskPool,
+    TeamsTemplate,
+)
+
+from templates.analyzer import trust_template
+from templates.backend import BackendError, FakeBackend
+from templates.columnar import ColumnarRenderer, is_stampable
+from templates.enums import UserFieldOperation, UserFieldType
+from templates.execute import Rendered, execute, execute_many, task_prereqs
+from templates.journal import SubmissionJournal
+from templates.models import (
+    OnefuzzTemplate,
+    OnefuzzTemplateMatrixRequest,
+    OnefuzzTemplateNotification,
+    OnefuzzTemplateRecord,
+    OnefuzzTemplateRequest,
+    UserField,
+    UserFieldLocation,
+)
+from templates.notifications import NotificationPlanner
+from templates.records import (
+    MemoryTemplateStore,
+    TemplateStore,
+    make_record,
+    rehydrate,
+)
+from templates.serialize import encode, parse_request
+from templates.service import ServiceStats, TemplateService
+from templates.template import (
+    CompiledTemplate,
+    IncrementalRenderer,
+    RenderCache,
+    build_input_config,
+    compile_template,
+    expand_matrix,
+    render,
+    render_many,
+    template_container_types,
+    template_hash,
+)
+from templates.usertemplates import get_compiled, get_template
+
+SAMPLE_CONTAINERS = [
+    {"name": "mynorepro", "type": "no_repro"},
+    {"name": "mysetup", "type": "setup"},
+    {"name": "myreports", "type": "reports"},
+    {"name": "myuniq", "type": "unique_reports"},
+    {"name": "mycrashes", "type": "crashes"},
+    {"name": "mycoverage", "type": "coverage"},
+    {"name": "myinputs", "type": "inputs"},
+    {"name": "myinputs", "type": "readonly_inputs"},
+]
+
+
+def sample_request(index: int) -> OnefuzzTemplateRequest:
+    return OnefuzzTemplateRequest(
+        template_name="libfuzzer_basic",
+        user_fields={
+            "project": "my project name",
+            "name": f"target-{index}",
+            "build": f"build-{index}",
+            "pool_name": "windows",
+            "target_exe": f"fuzz-{index}.exe",
+        },
+        containers=[
+            {"name": f"{x['name']}-{index}", "type": x["type"]}
+            for x in SAMPLE_CONTAINERS
+        ],
+    )
+
+
+def sample_requests(count: int) -> List[OnefuzzTemplateRequest]:
+    return [sample_request(x) for x in range(count)]
+
+
+def measure(
+    name: str, count: int, func: Callable[[], object], repeat: int = 5
+) -> float:
+    # the fastest of `repeat` runs.  `timeit` pauses the garbage collector
+    # while each runs, so a collection of garbage left by earlier benchmarks
+    # is not counted against this one.
+    elapsed = min(timeit.repeat(func, number=1, repeat=repeat))
+    rate = count / elapsed
+    print(f"{name:<32} {count:>8} in {elapsed:8.3f}s {rate:12.1f}/s")
+    return rate
+
+
+def bench_batch(args: argparse.Namespace) -> None:
+    template = get_template("libfuzzer_basic")
+    assert template is not None
+    requests = sample_requests(args.count)
+
+    measure(
+        "render (loop)", args.count, lambda: [render(x, template) for x in requests]
+    )
+    measure("render_many", args.count, lambda: render_many(requests, template))
+    measure(
+        "render_many (strict)",
+        args.count,
+        lambda: render_many(requests, template, strict=True),
+    )
+
+
+def bench_matrix(args: argparse.Namespace) -> None:
+    # a project onboarded as `targets` fuzz targets, each built `builds` times
+    template = get_template("libfuzzer_basic")
+    assert template is not None
+    compiled = compile_template(template)
+    request = OnefuzzTemplateMatrixRequest(
+        template_name="libfuzzer_basic",
+        user_fields={
+            "project": "my project name",
+            "name": "my target name",
+            "pool_name": "windows",
+        },
+        matrix={
+            "target_exe": [f"fuzz-{x}.exe" for x in range(args.count)],
+            "build": [f"build-{x}" for x in range(args.builds)],
+        },
+        containers=SAMPLE_CONTAINERS,
+    )
+    count = args.count * args.builds
+
+    def consume(rendered: Iterable[OnefuzzTemplate]) -> None:
+        for _ in rendered:
+            pass
+
+    def per_request() -> None:
+        consume(compiled.render(x) for x in expand_matrix(request))
+
+    def matrix() -> None:
+        consume(compiled.render_matrix(request))
+
+    measure("render (per combination)", count, per_request)
+    measure("render_matrix", count, matrix)
+    for name, func in [
+        ("render (per combination)", per_request),
+        ("render_matrix", matrix),
+    ]:
+        print(f"{name:<32} peak memory {peak_memory(func) / 1024:10.1f} KiB")
+
+
+def retained_memory(func: Callable[[], object]) -> int:
+    # memory still allocated while the result of `func` is held
+    tracemalloc.start()
+    try:
+        result = func()
+        size = tracemalloc.get_traced_memory()[0]
+        del result
+        return size
+    finally:
+        tracemalloc.stop()
+
+
+def bench_memory(args: argparse.Namespace) -> None:
+    # memory held by a queue of rendered jobs
+    template = get_template("libfuzzer_basic")
+    assert template is not None
+    compiled = compile_template(template)
+    requests = sample_requests(args.count)
+
+    for name, func in [
+        (
+            "render (strict)",
+            lambda: [compiled.render(x, strict=True) for x in requests],
+        ),
+        ("render", lambda: [compiled.render(x) for x in requests]),
+        ("render_shared", lambda: [compiled.render_shared(x) for x in requests]),
+    ]:
+        size = retained_memory(func)
+        print(
+            f"{name:<32} {args.count:>8} held {size / 1024:10.1f} KiB "
+            f"{size / args.count:10.1f} bytes each"
+        )
+
+
+def bench_columnar(args: argparse.Namespace) -> None:
+    compiled = get_compiled("libfuzzer_basic")
+    assert compiled is not None
+    requests = sample_requests(args.count)
+    fields = list(requests[0].user_fields)
+    columns = {x: [r.user_fields[x] for r in requests] for x in fields}
+    container_types = [ContainerType(x["type"]) for x in SAMPLE_CONTAINERS]
+    names = {
+        x: [y.name for r in requests for y in r.containers if y.type == x]
+        for x in container_types
+    }
+
+    def columnar() -> None:
+        renderer = ColumnarRenderer(compiled, fields, container_columns=names)
+        renderer.render_columns(columns, names)
+
+    measure(
+        "render + json",
+        args.count,
+        lambda: [compiled.render(x).json() for x in requests],
+    )
+    measure("columnar", args.count, columnar)
+
+
+def bench_serialize(args: argparse.Namespace) -> None:
+    compiled = get_compiled("libfuzzer_basic")
+    assert compiled is not None
+    requests = sample_requests(args.count)
+    rendered = [compiled.render(x) for x in requests]
+    payloads = [x.json() for x in requests]
+
+    measure("rendered .json()", args.count, lambda: [x.json() for x in rendered])
+    measure("rendered encode", args.count, lambda: [encode(x) for x in rendered])
+    measure(
+        "request parse_raw",
+        args.count,
+        lambda: [OnefuzzTemplateRequest.parse_raw(x) for x in payloads],
+    )
+    measure(
+        "request parse_request",
+        args.count,
+        lambda: [parse_request(x) for x in payloads],
+    )
+    measure(
+        "request parse_request (trusted)",
+        args.count,
+        lambda: [parse_request(x, trusted=True) for x in payloads],
+    )
+
+
+def bench_records(args: argparse.Namespace) -> None:
+    # job history stored as full rendered JSON, against compact records and a
+    # content-addressed template store
+    template = get_template("libfuzzer_basic")
+    assert template is not None
+    compiled = compile_template(template)
+    requests = sample_requests(args.count)
+    store = MemoryTemplateStore()
+
+    full = [compiled.render(x).json() for x in requests]
+    records = [make_record(x, template, store).json() for x in requests]
+    stored = len(store.read(store.put(template)) or b"")
+    full_size = sum(len(x) for x in full)
+    record_size = sum(len(x) for x in records) + stored
+    print(f"full JSON     {full_size / 1024:10.1f} KiB")
+    print(
+        f"records       {record_size / 1024:10.1f} KiB "
+        f"({stored / 1024:.1f} KiB of templates, "
+        f"{full_size / record_size:.1f}x smaller)"
+    )
+
+    measure(
+        "parse full JSON",
+        args.count,
+        lambda: [OnefuzzTemplate.parse_raw(x) for x in full],
+    )
+
+    def rehydrate_all(store: TemplateStore) -> None:
+        for record in records:
+            rehydrate(OnefuzzTemplateRecord.parse_raw(record), store)
+
+    def cold_store() -> TemplateStore:
+        store = MemoryTemplateStore()
+        store.put(template)
+        return store
+
+    warm = cold_store()
+    measure("rehydrate (cold store)", args.count, lambda: rehydrate_all(cold_store()))
+    measure("rehydrate (warm store)", args.count, lambda: rehydrate_all(warm))
+
+
+def bench_containers(args: argparse.Namespace) -> None:
+    # container binding should scale linearly with tasks x container types
+    for containers in (4, 16):
+        for tasks in (4, 16, 64, 256):
+            template = synthetic_template(tasks, 1, 1, containers)
+            compiled = compile_template(template)
+            request = synthetic_request(template)
+            rate = ops_per_sec(lambda: compiled.render(request), args.min_time)
+            slots = tasks * containers
+            print(
+                f"tasks={tasks:<4} containers={containers:<3} {rate:10.1f} renders/s "
+                f"{1e6 / rate / slots:8.2f}us per container"
+            )
+
+
+STARTUP_EAGER = """
+from templates.usertemplates import libfuzzer_basic
+TEMPLATES = {f"t{x}": libfuzzer_basic() for x in range(COUNT)}
+TEMPLATES["t0"]
+"""
+
+STARTUP_LAZY = """
+from templates.registry import TemplateRegistry
+from templates.usertemplates import libfuzzer_basic
+TEMPLATES = TemplateRegistry()
+for x in range(COUNT):
+    TEMPLATES.register(f"t{x}", libfuzzer_basic)
+TEMPLATES["t0"]
+"""
+
+
+STARTUP_CLI = """
+import time
+from templates.usertemplates import get_compiled, get_input_config
+start = time.perf_counter()
+for name in ("afl_basic", "libfuzzer_basic"):
+    get_input_config(name)
+    get_compiled(name)
+print(time.perf_counter() - start)
+"""
+
+
+def startup_time(
+    script: str, runs: int, cache_dir: str = "", cold: bool = False
+) -> Tuple[float, float]:
+    # the fastest wall-clock time of the process, and of the time the script
+    # reports on stdout, if any
+    root = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=root, ONEFUZZ_TEMPLATE_CACHE=cache_dir)
+    best = (float("inf"), float("inf"))
+    for _ in range(runs):
+        if cold and os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, script], check=True, env=env, stdout=subprocess.PIPE
+        ).stdout
+        elapsed = time.perf_counter() - start
+        reported = float(output) if output.strip() else 0.0
+        best = (min(best[0], elapsed), min(best[1], reported))
+    return best
+
+
+def bench_cache(args: argparse.Namespace) -> None:
+    # a CLI invocation that needs the input config and compiled form of every
+    # template, without the on-disk cache, with an empty one and a populated one
+    with tempfile.TemporaryDirectory() as tmpdir:
+        script = os.path.join(tmpdir, "cli.py")
+        with open(script, "w") as handle:
+            handle.write(STARTUP_CLI)
+        cache_dir = os.path.join(tmpdir, "cache")
+
+        results = {
+            "no cache": startup_time(script, args.runs),
+            "cold cache": startup_time(
+                script, args.runs, cache_dir=cache_dir, cold=True
+            ),
+            "warm cache": startup_time(script, args.runs, cache_dir=cache_dir),
+        }
+
+    for name, (process, templates) in results.items():
+        print(
+            f"{name:<12} process {process * 1000:8.1f}ms "
+            f"templates {templates * 1000:8.2f}ms"
+        )
+
+
+def bench_startup(args: argparse.Namespace) -> None:
+    # process startup, importing a catalog of `count` templates and looking up
+    # one of them, as a CLI invocation would
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for count in args.counts:
+            times = {}
+            for name, source in (("eager", STARTUP_EAGER), ("lazy", STARTUP_LAZY)):
+                script = os.path.join(tmpdir, f"{name}_{count}.py")
+                with open(script, "w") as handle:
+                    handle.write(source.replace("COUNT", str(count)))
+                times[name] = startup_time(script, args.runs)[0]
+            print(
+                f"templates={count:<5} eager {times['eager'] * 1000:8.1f}ms "
+                f"lazy {times['lazy'] * 1000:8.1f}ms"
+            )
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench_execute(args: argparse.Namespace) -> None:
+    template = get_template("libfuzzer_basic")
+    assert template is not None
+    compiled = compile_template(template)
+    requests = sample_requests(args.count)
+    backend = FakeBackend(latency=args.latency, jitter=args.jitter, seed=0)
+
+    def submit(request: OnefuzzTemplateRequest) -> float:
+        start = time.perf_counter()
+        execute(request, compiled.render(request), backend, max_workers=args.workers)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        latencies = list(executor.map(submit, requests))
+    elapsed = time.perf_counter() - start
+
+    print(f"render+execute {args.count} in {elapsed:.3f}s {args.count / elapsed:.1f}/s")
+    for pct in (50, 90, 99):
+        print(f"  p{pct:<3} {percentile(latencies, pct) * 1000:8.2f}ms")
+    print(f"  max  {max(latencies) * 1000:8.2f}ms")
+    print(f"  backend calls {len(backend.calls)}")
+
+
+def check_submission(rendered: Rendered, job: Job, tasks: List[Task]) -> List[str]:
+    errors = []
+    for prereqs, task, config in zip(
+        task_prereqs(rendered.tasks), tasks, rendered.tasks
+    ):
+        if task.config.job_id != job.job_id:
+            errors.append(f"task {task.task_id} created in job {task.config.job_id}")
+        if prereqs and task.config.prereq_tasks != [tasks[x].task_id for x in prereqs]:
+            errors.append(f"task {task.task_id} has prereqs from another submission")
+        if task.config.task.type != config.task.type:
+            errors.append(f"task {task.task_id} submitted out of order")
+    return errors
+
+
+def equivalence_template() -> OnefuzzTemplate:
+    # locations exercising each kind of patch: appending to and inserting
+    # into lists, adding dict keys, replacing a whole list or dict, naming a
+    # container that would otherwise be bound, and enum fields
+    def task(task_type: TaskType, prereq: bool) -> TaskConfig:
+        return TaskConfig(
+            job_id=UUID(int=0),
+            prereq_tasks=[UUID(int=0)] if prereq else None,
+            task=TaskDetails(
+                type=task_type,
+                duration=1,
+                target_exe="fuzz.exe",
+                target_env={"EXISTING": "1"},
+                target_options=["-existing"],
+            ),
+            pool=TaskPool(count=1, pool_name="pool"),
+            containers=[
+                TaskContainers(name="", type=ContainerType.crashes),
+                TaskContainers(name="", type=ContainerType.inputs),
+                TaskContainers(name="", type=ContainerType.setup),
+            ],
+            tags={},
+        )
+
+    def field(name: str, field_type: str, op: str, *paths: str) -> UserField:
+        return UserField(
+            name=name,
+            type=UserFieldType(field_type),
+            required=name == "target_exe",
+            locations=[
+                UserFieldLocation(op=UserFieldOperation(op), path=x) for x in paths
+            ],
+        )
+
+    return OnefuzzTemplate(
+        job=JobConfig(project="", name="", build="", duration=1),
+        tasks=[
+            task(TaskType.libfuzzer_fuzz, False),
+            task(TaskType.libfuzzer_crash_report, True),
+        ],
+        notifications=[],
+        user_fields=[
+            field("target_exe", "Str", "replace", "/tasks/0/task/target_exe"),
+            field("append", "Str", "add", "/tasks/0/task/target_options/-"),
+            field("insert", "Str", "add", "/tasks/1/task/target_options/0"),
+            field("options", "ListStr", "replace", "/tasks/1/task/target_options"),
+            field("env_key", "Str", "add", "/tasks/0/task/target_env/ADDED"),
+            field("env", "DictStr", "replace", "/tasks/1/task/target_env"),
+            field("tags", "DictStr", "replace", "/tasks/0/tags", "/tasks/1/tags"),
+            field("crashes", "Str", "replace", "/tasks/1/containers/0/name"),
+            field("task_type", "Str", "replace", "/tasks/1/task/type"),
+            field("stats", "Str", "add", "/tasks/0/task/stats_format"),
+            field(
+                "duration", "Int", "replace", "/job/duration", "/tasks/0/task/duration"
+            ),
+            field("debugger", "Bool", "add", "/tasks/0/task/check_debugger"),
+        ],
+    )
+
+
+def random_value(rng: random.Random, compiled: CompiledTemplate, name: str) -> object:
+    validator = compiled.validators[name]
+    choices = sorted(validator.choices) if validator.choices is not None else None
+
+    def text() -> str:
+        if choices is not None:
+            return rng.choice(choices)
+        return rng.choice(["a", "b", "with space", "ünïcode", 'quote"d', ""])
+
+    field_type = compiled.fields[name].field.type
+    if field_type == UserFieldType.Bool:
+        return rng.random() < 0.5
+    if field_type == UserFieldType.Int:
+        return rng.randint(1, 3)
+    if field_type == UserFieldType.Str:
+        return text()
+    if field_type == UserFieldType.DictStr:
+        return {
+            rng.choice(["K1", "K2", "K3"]): text() for _ in range(rng.randint(0, 3))
+        }
+    return [text() for _ in range(rng.randint(0, 3))]
+
+
+def random_request(
+    rng: random.Random,
+    compiled: CompiledTemplate,
+    previous: Optional[OnefuzzTemplateRequest] = None,
+) -> OnefuzzTemplateRequest:
+    # usually a small change to `previous`, so incremental renders and cache
+    # hits are exercised as well as full renders
+    container_types = template_container_types(compiled.template)
+    if previous is not None and rng.random() < 0.8:
+        user_fields = dict(previous.user_fields)
+        containers = [x.copy() for x in previous.containers]
+        name = rng.choice(list(compiled.fields))
+        if name in user_fields and not compiled.fields[name].field.required:
+            if rng.random() < 0.3:
+                del user_fields[name]
+            else:
+                user_fields[name] = random_value(rng, compiled, name)
+        else:
+            user_fields[name] = random_value(rng, compiled, name)
+        if containers and rng.random() < 0.2:
+            rng.choice(containers).name = rng.choice(["c1", "c2", "c3"])
+    else:
+        user_fields = {
+            name: random_value(rng, compiled, name)
+            for name, x in compiled.fields.items()
+            if x.field.required or rng.random() < 0.5
+        }
+        containers = [
+            TaskContainers(name=rng.choice(["c1", "c2", "c3"]), type=x)
+            for x in container_types
+        ]
+    return OnefuzzTemplateRequest(
+        template_name="equivalence", user_fields=user_fields, containers=containers
+    )
+
+
+def strict_json(compiled: CompiledTemplate, request: OnefuzzTemplateRequest) -> str:
+    # the reference every render path must match, or an error if it fails
+    try:
+        return compiled.render(request, strict=True).json()
+    except Exception as err:
+        return f"error: {type(err).__name__}"
+
+
+def check_equivalence(
+    compiled: CompiledTemplate, rng: random.Random, count: int
+) -> List[str]:
+    # every render path, against parsing the patched document in full
+    def same(path: str, index: int, func: Callable[[], str], expected: str) -> None:
+        try:
+            actual = func()
+        except Exception as err:
+            actual = f"error: {type(err).__name__}"
+        if actual.startswith("error: ") and expected.startswith("error: "):
+            return
+        if actual != expected:
+            errors.append(f"{path} differs from a strict render for request {index}")
+
+    errors: List[str] = []
+    requests: List[OnefuzzTemplateRequest] = []
+    for _ in range(count):
+        requests.append(
+            random_request(rng, compiled, requests[-1] if requests else None)
+        )
+    expected = [strict_json(compiled, x) for x in requests]
+
+    cache = RenderCache(maxsize=count // 4 or 1)
+    incremental = IncrementalRenderer(compiled)
+    for index, request in enumerate(requests):
+        for path, func in [
+            ("render", lambda: compiled.render(request).json()),
+            ("render_shared", lambda: compiled.render_shared(request).json()),
+            ("RenderCache", lambda: cache.render(compiled, request).json()),
+            ("IncrementalRenderer", lambda: incremental.render(request).json()),
+        ]:
+            same(path, index, func, expected[index])
+
+    for index, request in enumerate(requests[: count // 10 or 1]):
+        names = rng.sample(list(compiled.fields), min(2, len(compiled.fields)))
+        matrix = OnefuzzTemplateMatrixRequest(
+            template_name=request.template_name,
+            user_fields={
+                k: v for k, v in request.user_fields.items() if k not in names
+            },
+            matrix={
+                x: [random_value(rng, compiled, x) for _ in range(3)] for x in names
+            },
+            containers=request.containers,
+        )
+        combinations = [strict_json(compiled, x) for x in expand_matrix(matrix)]
+        try:
+            rendered = [x.json() for x in compiled.render_matrix(matrix)]
+        except Exception:
+            # matrix values are checked before any combination is rendered,
+            # so a value failing in some combination fails the whole matrix
+            if not any(x.startswith("error: ") for x in combinations):
+                errors.append(f"render_matrix failed for request {index}")
+            continue
+        if rendered != combinations:
+            errors.append(f"render_matrix differs from strict renders for {index}")
+
+    if compiled.trusted:
+        # columns need every row to provide the same fields, and only fields
+        # whose locations can be stamped into the serialized template
+        paths = [op.pointer.parts for x in compiled.fields.values() for op in x.ops]
+        fields = [
+            name
+            for name, x in compiled.fields.items()
+            if all(is_stampable(compiled, op, paths) for op in x.ops)
+        ]
+        rows = [
+            OnefuzzTemplateRequest(
+                template_name=x.template_name,
+                user_fields={
+                    name: x.user_fields.get(name, random_value(rng, compiled, name))
+                    for name in fields
+                },
+                containers=x.containers,
+            )
+            for x in requests
+        ]
+        container_types = template_container_types(compiled.template)
+        names = {
+            t: [next(c.name for c in x.containers if c.type == t) for x in rows]
+            for t in container_types
+        }
+        renderer = ColumnarRenderer(compiled, fields, container_columns=container_types)
+        results = renderer.render_columns(
+            {name: [x.user_fields[name] for x in rows] for name in fields}, names
+        )
+        for index, (row, (rendered_ok, text)) in enumerate(zip(rows, results)):
+            same(
+                "ColumnarRenderer",
+                index,
+                lambda: text if rendered_ok else "error: Exception",
+                strict_json(compiled, row),
+            )
+
+    return errors
+
+
+def bench_stress(args: argparse.Namespace) -> None:
+    # renders from one shared compiled template and render cache on a thread
+    # pool, and submits each rendered template several times at once.  fails
+    # if a render differs from rendering single-threaded, if any submission
+    # mixes up jobs or prereqs, or if submitting changes the rendered template.
+    # first, every render path is checked against a strict render of random
+    # requests, on the builtin templates and one covering each kind of patch
+    rng = random.Random(0)
+    checked = [get_compiled(x) for x in ["libfuzzer_basic", "afl_basic"]]
+    checked.append(trust_template(compile_template(equivalence_template())))
+    equivalence = [
+        x
+        for compiled in checked
+        if compiled
+        for x in check_equivalence(compiled, rng, args.count)
+    ]
+
+    compiled = get_compiled("libfuzzer_basic")
+    assert compiled is not None
+    template_before = template_hash(compiled.template)
+    requests = sample_requests(args.count)
+    expected = [compiled.render(x).json() for x in requests]
+    cache = RenderCache(maxsize=args.count // 2)
+    backend = FakeBackend(latency=args.latency, jitter=args.latency, seed=0)
+    calls = ThreadPoolExecutor(max_workers=args.backend_workers)
+
+    def run(index: int) -> List[str]:
+        request = requests[index % len(requests)]
+        rendered: Rendered
+        if index % len(requests) % 3 == 0:
+            rendered = compiled.render(request)
+        elif index % len(requests) % 3 == 1:
+            rendered = compiled.render_shared(request)
+        else:
+            rendered = cache.render(compiled, request)
+        if rendered.json() != expected[index % len(requests)]:
+            return [f"request {index} rendered differently"]
+
+        with ThreadPoolExecutor(max_workers=args.repeat) as submitters:
+            submissions = list(
+                submitters.map(
+                    lambda _: execute(request, rendered, backend, executor=calls),
+                    range(args.repeat),
+                )
+            )
+
+        errors = []
+        if len(set(job.job_id for job, _ in submissions)) != args.repeat:
+            errors.append(f"request {index} submissions shared a job")
+        for job, tasks in submissions:
+            errors.extend(check_submission(rendered, job, tasks))
+        if rendered.json() != expected[index % len(requests)]:
+            errors.append(f"request {index} was modified by execute")
+        return errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        results = list(executor.map(run, range(args.count * args.rounds)))
+    elapsed = time.perf_counter() - start
+    calls.shutdown()
+
+    errors = equivalence + [x for result in results for x in result]
+    if template_hash(compiled.template) != template_before:
+        errors.append("compiled template was modified")
+
+    submissions = args.count * args.rounds * args.repeat
+    print(
+        f"stress {args.count * args.rounds} renders, {submissions} submissions "
+        f"in {elapsed:.3f}s on {args.threads} threads"
+    )
+    print(f"  backend calls {len(backend.calls)}, {cache.stats()}")
+    print(f"  {len(checked)} templates checked against strict renders")
+    if errors:
+        for error in errors[:20]:
+            print(f"  {error}")
+        raise Exception(f"{len(errors)} errors under stress")
+    print("  ok")
+
+
+def bench_journal(args: argparse.Namespace) -> None:
+    # bulk submission with no journal, a journal fsynced on every record and
+    # one fsynced in batches, then a run failing part way whose failed
+    # submissions are resumed
+    compiled = get_compiled("libfuzzer_basic")
+    assert compiled is not None
+    requests = sample_requests(args.count)
+    rendered = [compiled.render_shared(x) for x in requests]
+    root = tempfile.mkdtemp()
+
+    def submit_all(
+        backend: FakeBackend,
+        journal: Optional[SubmissionJournal],
+        indexes: Optional[List[int]] = None,
+    ) -> List[Optional[Exception]]:
+        def submit(index: int) -> Optional[Exception]:
+            try:
+                execute(requests[index], rendered[index], backend, journal=journal)
+            except BackendError as err:
+                return err
+            return None
+
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            if indexes is None:
+                indexes = list(range(len(requests)))
+            return list(executor.map(submit, indexes))
+
+    try:
+        for name, sync_every in [("none", 0), ("fsync each", 1), ("batched", 256)]:
+            path = os.path.join(root, f"{sync_every}.journal")
+            journal = SubmissionJournal(path, sync_every=sync_every or 1)
+            backend = FakeBackend(latency=args.latency, seed=0)
+            start = time.perf_counter()
+            submit_all(backend, journal if sync_every else None)
+            elapsed = time.perf_counter() - start
+            journal.close()
+            print(
+                f"journal {name:<12} {args.count} in {elapsed:.3f}s "
+                f"{args.count / elapsed:.1f}/s"
+            )
+
+        path = os.path.join(root, "resume.journal")
+        calls = len(backend.calls)
+        failing = FakeBackend(latency=args.latency, fail_after=calls // 2, seed=0)
+        with SubmissionJournal(path) as journal:
+            errors = submit_all(failing, journal)
+        failed = [x for x, err in enumerate(errors) if err is not None]
+        resumed = FakeBackend(latency=args.latency, seed=0)
+        resumed.jobs, resumed.tasks = failing.jobs, failing.tasks
+        with SubmissionJournal(path) as journal:
+            submit_all(resumed, journal, failed)
+        # reopening compacts away the records of the completed submissions
+        SubmissionJournal(path).close()
+        print(
+            f"resume after {len(failed)} failed submissions: {len(resumed.calls)} "
+            f"calls instead of {calls}, {len(resumed.jobs)} jobs for {args.count} "
+            f"requests, {os.path.getsize(path)} journal bytes left"
+        )
+    finally:
+        shutil.rmtree(root)
+
+
+def bench_notifications(args: argparse.Namespace) -> None:
+    # a batch whose jobs report to a few shared unique_reports containers,
+    # submitted one by one against planning the batch's notifications first
+    template = get_template("libfuzzer_basic")
+    assert template is not None
+    template = template.copy(
+        update={
+            "notifications": [
+                OnefuzzTemplateNotification(
+                    container_type=ContainerType.unique_reports,
+                    notification=NotificationConfig(
+                        config=TeamsTemplate(url="https://example.com/webhook")
+                    ),
+                )
+            ]
+        }
+    )
+    compiled = compile_template(template)
+    requests = []
+    for index, request in enumerate(sample_requests(args.count)):
+        shared = f"myuniq-shared-{index % args.containers}"
+        containers = [
+            (
+                x.copy(update={"name": shared})
+                if x.type == ContainerType.unique_reports
+                else x
+            )
+            for x in request.containers
+        ]
+        requests.append(request.copy(update={"containers": containers}))
+    submissions = [(x, compiled.render_shared(x)) for x in requests]
+
+    def notification_calls(backend: FakeBackend) -> int:
+        return len([x for x in backend.calls if x.method == "create_notification"])
+
+    backend = FakeBackend(latency=args.latency, seed=0)
+    start = time.perf_counter()
+    for request, rendered in submissions:
+        execute(request, rendered, backend)
+    elapsed = time.perf_counter() - start
+    print(
+        f"execute each {args.count} in {elapsed:.3f}s, "
+        f"{notification_calls(backend)} notification calls"
+    )
+
+    backend = FakeBackend(latency=args.latency, seed=0)
+    planner = NotificationPlanner(backend)
+    start = time.perf_counter()
+    execute_many(submissions, backend, planner=planner)
+    elapsed = time.perf_counter() - start
+    print(
+        f"execute_many {args.count} in {elapsed:.3f}s, "
+        f"{notification_calls(backend)} notification calls"
+    )
+
+    start = time.perf_counter()
+    execute_many(submissions, backend, planner=planner)
+    elapsed = time.perf_counter() - start
+    print(
+        f"  again      {args.count} in {elapsed:.3f}s, "
+        f"{notification_calls(backend)} notification calls in total"
+    )
+
+
+def bench_service(args: argparse.Namespace) -> None:
+    requests = sample_requests(args.count)
+    backend = FakeBackend(latency=args.latency, jitter=args.jitter, seed=0)
+    latencies: List[float] = []
+    max_queued = 0
+
+    async def timed(service: TemplateService, request: OnefuzzTemplateRequest) -> None:
+        nonlocal max_queued
+        start = time.perf_counter()
+        pending = asyncio.ensure_future(service.submit(request))
+        await asyncio.sleep(0)
+        max_queued = max(max_queued, service.stats().queued)
+        await pending
+        latencies.append(time.perf_counter() - start)
+
+    async def client(
+        service: TemplateService, queue: List[OnefuzzTemplateRequest]
+    ) -> None:
+        # closed loop: each client sends its next request once the last one
+        # completes
+        while queue:
+            await timed(service, queue.pop())
+
+    async def run() -> ServiceStats:
+        async with TemplateService(
+            backend,
+            concurrency=args.concurrency,
+            max_queued=args.max_queued,
+            backend_workers=args.backend_workers,
+        ) as service:
+            if args.rate:
+                # open loop: requests arrive at a fixed rate, however long
+                # earlier ones take
+                pending = []
+                for request in requests:
+                    pending.append(asyncio.ensure_future(timed(service, request)))
+                    await asyncio.sleep(1 / args.rate)
+                await asyncio.gather(*pending)
+            else:
+                queue = list(requests)
+                await asyncio.gather(
+                    *[client(service, queue) for _ in range(args.clients)]
+                )
+        return service.stats()
+
+    start = time.perf_counter()
+    stats = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    print(f"service {args.count} in {elapsed:.3f}s {args.count / elapsed:.1f}/s")
+    for pct in (50, 90, 99):
+        print(f"  p{pct:<3} {percentile(latencies, pct) * 1000:8.2f}ms")
+    print(f"  max  {max(latencies) * 1000:8.2f}ms")
+    print(
+        f"  max queued {max_queued}, completed {stats.completed}, failed {stats.failed}"
+    )
+    print(f"  backend calls {len(backend.calls)}")
+
+
+def synthetic_template(
+    tasks: int, fields: int, locations: int, containers: int
+) -> OnefuzzTemplate:
+    container_types = list(ContainerType)[:containers]
+    return OnefuzzTemplate(
+        job=JobConfig(project="", name="", build="", duration=1),
+        tasks=[
+            TaskConfig(
+                job_id=UUID(int=0),
+                prereq_tasks=[UUID(int=0)] if idx else None,
+                task=TaskDetails(
+                    type=TaskType.libfuzzer_fuzz,
+                    duration=1,
+                    target_exe="fuzz.exe",
+                    target_env={},
+                    target_options=[],
+                ),
+                pool=TaskPool(count=1, pool_name="pool"),
+                containers=[TaskContainers(name="", type=x) for x in container_types],
+                tags={},
+            )
+            for idx in range(tasks)
+        ],
+        notifications=[],
+        user_fields=[
+            UserField(
+                name=f"field_{field}",
+                type=UserFieldType.Str,
+                required=True,
+                locations=[
+                    UserFieldLocation(
+                        op=UserFieldOperation.add,
+                        path=f"/tasks/{location % tasks}/tags/f{field}_l{location}",
+                    )
+                    for location in range(locations)
+                ],
+            )
+            for field in range(fields)
+        ],
+    )
+
+
+def synthetic_request(template: OnefuzzTemplate) -> OnefuzzTemplateRequest:
+    user_fields: Dict[str, object] = {
+        "project": "project",
+        "name": "name",
+        "build": "build",
+    }
+    user_fields.update({x.name: f"{x.name}-value" for x in template.user_fields})
+    return OnefuzzTemplateRequest(
+        template_name="synthetic",
+        user_fields=user_fields,
+        containers=[
+            {"name": f"container-{x.name}", "type": x}
+            for x in template_container_types(template)
+        ],
+    )
+
+
+def suite_cases() -> Dict[str, Tuple[OnefuzzTemplate, OnefuzzTemplateRequest]]:
+    libfuzzer = get_template("libfuzzer_basic")
+    afl = get_template("afl_basic")
+    assert libfuzzer is not None and afl is not None
+
+    cases = {
+        "libfuzzer_basic": (libfuzzer, sample_request(0)),
+        "afl_basic": (
+            afl,
+            OnefuzzTemplateRequest(
+                template_name="afl_basic",
+                user_fields={
+                    "project": "my project name",
+                    "name": "my target name",
+                    "build": "build # here",
+                    "pool_name": "linux",
+                    "target_options": ["input@@"],
+                    "supervisor_exe": "afl-fuzz",
+                    "supervisor_input_marker": "@@",
+                    "supervisor_options": ["-d", "-t", "1000"],
+                    "supervisor_env": {"AFL_SKIP_CPUFREQ": "1"},
+                },
+                containers=[
+                    x
+                    for x in SAMPLE_CONTAINERS
+                    if x["type"] not in ("coverage", "readonly_inputs")
+                ],
+            ),
+        ),
+    }
+
+    # each dimension is scaled on its own from a common base
+    base = {"tasks": 4, "fields": 8, "locations": 2, "containers": 4}
+    scales = {
+        "tasks": [1, 16, 64],
+        "fields": [32, 128],
+        "locations": [1, 8],
+        "containers": [1, 16],
+    }
+    for dimension, values in scales.items():
+        for value in values:
+            params = dict(base, **{dimension: value})
+            template = synthetic_template(**params)
+            name = "synthetic " + " ".join(f"{k}={v}" for k, v in params.items())
+            cases[name] = (template, synthetic_request(template))
+    return cases
+
+
+def calibrate(timer: timeit.Timer, min_time: float) -> Tuple[int, float]:
+    # the number of calls taking at least `min_time` seconds, and their time
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            return number, elapsed
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+
+
+def ops_per_sec(func: Callable[[], object], min_time: float, repeat: int = 5) -> float:
+    # the best of `repeat` runs of at least `min_time` seconds, each with the
+    # garbage collector paused by `timeit`
+    timer = timeit.Timer(func)
+    number, elapsed = calibrate(timer, min_time)
+    return number / min([elapsed] + timer.repeat(repeat - 1, number))
+
+
+def peak_memory(func: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def suite_operations(
+    template: OnefuzzTemplate, request: OnefuzzTemplateRequest
+) -> Dict[str, Callable[[], object]]:
+    compiled = compile_template(template)
+    raw = template.dict()
+    return {
+        "render": lambda: compiled.render(request),
+        "render (strict)": lambda: compiled.render(request, strict=True),
+        "compile_template": lambda: compile_template(template),
+        "build_input_config": lambda: build_input_config(template),
+        "template_container_types": lambda: template_container_types(template),
+        "validate": lambda: OnefuzzTemplate.parse_obj(raw),
+    }
+
+
+def bench_suite(args: argparse.Namespace) -> None:
+    # each operation keeps its best of `repeat` short runs, with the garbage
+    # collector paused.  the runs are made in rounds over every operation,
+    # so a slow spell on the machine only costs each operation a few runs.
+    operations: Dict[str, Callable[[], object]] = {}
+    for case, (template, request) in suite_cases().items():
+        for operation, func in suite_operations(template, request).items():
+            operations[f"{case}: {operation}"] = func
+
+    timers: Dict[str, Tuple[timeit.Timer, int]] = {}
+    results: Dict[str, Dict[str, float]] = {}
+    for name, func in operations.items():
+        timer = timeit.Timer(func)
+        number, elapsed = calibrate(timer, args.min_time)
+        timers[name] = (timer, number)
+        results[name] = {"ops": number / elapsed, "peak": peak_memory(func)}
+
+    for _ in range(args.repeat - 1):
+        for name, (timer, number) in timers.items():
+            ops = number / timer.timeit(number)
+            results[name]["ops"] = max(results[name]["ops"], ops)
+
+    for name, result in results.items():
+        print(
+            f"{name:<80} {result['ops']:12.1f} ops/s "
+            f"{result['peak'] / 1024:10.1f} KiB"
+        )
+
+    if args.save:
+        with open(args.save, "w") as handle:
+            json.dump(results, handle, indent=4, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, "r") as handle:
+            baseline = json.load(handle)
+
+        # timings are relative to the median slowdown of the whole suite, as
+        # the speed of shared machines drifts by more than the threshold
+        # between runs, while a change to the code slows only some operations
+        common = [x for x in results if x in baseline]
+        if not common:
+            return
+        drift = statistics.median(
+            baseline[x]["ops"] / results[x]["ops"] for x in common
+        )
+        print(f"suite ran {drift:.2f}x slower than the baseline overall")
+
+        regressions = []
+        for name in common:
+            result = results[name]
+            slower = baseline[name]["ops"] / result["ops"] / drift
+            larger = result["peak"] / max(baseline[name]["peak"], 1)
+            if slower > args.threshold or larger > args.threshold:
+                regressions.append(
+                    f"{name}: {slower:.2f}x slower, {larger:.2f}x peak memory"
+                )
+
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="template benchmarks",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""examples:
+  python bench.py batch --count 1000      render_many against render per request
+  python bench.py execute                 render and submit against FakeBackend
+  python bench.py stress                  every render path against strict renders,
+                                          and concurrent use of shared templates
+  python bench.py suite --compare bench_baseline.json
+                                          fail on regressions from the baseline
+  python bench.py suite --save bench_baseline.json
+                                          refresh the baseline""",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser("batch", help="batch rendering throughput")
+    batch.add_argument("--count", type=int, default=1000)
+    batch.set_defaults(func=bench_batch)
+
+    matrix = subparsers.add_parser("matrix", help="matrix request expansion")
+    matrix.add_argument("--count", type=int, default=100, help="fuzz targets")
+    matrix.add_argument("--builds", type=int, default=1)
+    matrix.set_defaults(func=bench_matrix)
+
+    memory = subparsers.add_parser("memory", help="memory held by rendered templates")
+    memory.add_argument("--count", type=int, default=1000)
+    memory.set_defaults(func=bench_memory)
+
+    columnar = subparsers.add_parser("columnar", help="columnar batch rendering")
+    columnar.add_argument("--count", type=int, default=10000)
+    columnar.set_defaults(func=bench_columnar)
+
+    serialize = subparsers.add_parser("serialize", help="JSON encoding and parsing")
+    serialize.add_argument("--count", type=int, default=1000)
+    serialize.set_defaults(func=bench_serialize)
+
+    records = subparsers.add_parser("records", help="compact job history records")
+    records.add_argument("--count", type=int, default=1000)
+    records.set_defaults(func=bench_records)
+
+    containers = subparsers.add_parser("containers", help="container binding scaling")
+    containers.add_argument("--min-time", type=float, default=0.2)
+    containers.set_defaults(func=bench_containers)
+
+    startup = subparsers.add_parser(
+        "startup", help="import time as the template catalog grows"
+    )
+    startup.add_argument("--counts", type=int, nargs="+", default=[2, 50, 200])
+    startup.add_argument("--runs", type=int, default=3)
+    startup.set_defaults(func=bench_startup)
+
+    cache = subparsers.add_parser("cache", help="CLI startup with the on-disk cache")
+    cache.add_argument("--runs", type=int, default=5)
+    cache.set_defaults(func=bench_cache)
+
+    submit = subparsers.add_parser(
+        "execute", help="render and submit to an in-memory backend"
+    )
+    submit.add_argument("--count", type=int, default=200)
+    submit.add_argument("--latency", type=float, default=0.005)
+    submit.add_argument("--jitter", type=float, default=0.005)
+    submit.add_argument("--workers", type=int, default=8, help="calls per submission")
+    submit.add_argument("--concurrency", type=int, default=4, help="submissions")
+    submit.set_defaults(func=bench_execute)
+
+    stress = subparsers.add_parser(
+        "stress", help="concurrent rendering and submission of shared templates"
+    )
+    stress.add_argument("--count", type=int, default=200)
+    stress.add_argument("--rounds", type=int, default=3)
+    stress.add_argument("--repeat", type=int, default=4, help="submissions each")
+    stress.add_argument("--threads", type=int, default=16)
+    stress.add_argument("--backend-workers", type=int, default=32)
+    stress.add_argument("--latency", type=float, default=0.001)
+    stress.set_defaults(func=bench_stress)
+
+    journal = subparsers.add_parser("journal", help="resumable submission journal")
+    journal.add_argument("--count", type=int, default=500)
+    journal.add_argument("--concurrency", type=int, default=8)
+    journal.add_argument("--latency", type=float, default=0.0)
+    journal.set_defaults(func=bench_journal)
+
+    notifications = subparsers.add_parser(
+        "notifications", help="notification deduplication across a batch"
+    )
+    notifications.add_argument("--count", type=int, default=200)
+    notifications.add_argument(
+        "--containers", type=int, default=4, help="shared unique_reports containers"
+    )
+    notifications.add_argument("--latency", type=float, default=0.002)
+    notifications.set_defaults(func=bench_notifications)
+
+    service = subparsers.add_parser(
+        "service", help="load generator for the asyncio service against FakeBackend"
+    )
+    service.add_argument("--count", type=int, default=500)
+    service.add_argument("--clients", type=int, default=64)
+    service.add_argument(
+        "--rate", type=float, default=0, help="requests/s, or 0 to use --clients"
+    )
+    service.add_argument("--concurrency", type=int, default=16)
+    service.add_argument("--max-queued", type=int, default=32)
+    service.add_argument("--backend-workers", type=int, default=32)
+    service.add_argument("--latency", type=float, default=0.005)
+    service.add_argument("--jitter", type=float, default=0.005)
+    service.set_defaults(func=bench_service)
+
+    suite = subparsers.add_parser(
+        "suite",
+        help="render, config generation and validation on scaled templates",
+        description="measures ops/sec and peak memory for the existing templates "
+        "and synthetic templates scaled by tasks, fields, locations and "
+        "containers.  with --compare, fails if any is slower or larger than the "
+        "baseline by more than --threshold",
+    )
+    suite.add_argument("--min-time", type=float, default=0.03, help="seconds per run")
+    suite.add_argument("--repeat", type=int, default=15, help="runs, keeping the best")
+    suite.add_argument("--save", help="write results as a baseline")
+    suite.add_argument("--compare", help="baseline to check for regressions")
+    suite.add_argument(
+        "--threshold",
+        type=float,
+        default=1.5,
+        help="slowdown or memory growth, relative to the baseline, to flag.  "
+        "baselines are only comparable on the machine that saved them",
+    )
+    suite.set_defaults(func=bench_suite)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,12 @@
 
 from onefuzz.api import Onefuzz
 
+from templates import execute as submit
+from templates.backend import OnefuzzBackend
 from templates.models import OnefuzzTemplate, OnefuzzTemplateRequest
+from templates.serialize import dumps
 from templates.template import build_input_config, render
+from templates.tracing import LoggingSink, TracedBackend, add_sink
 from templates.usertemplates import get_template
 
 
@@ -12,25 +16,8 @@ def execute(request: OnefuzzTemplateRequest, config: OnefuzzTemplate) -> None:
     # the storage containers have been created and content uploaded to them.
 
     o = Onefuzz()
-
-    for template_notification in config.notifications:
-        for task_container in request.containers:
-            if task_container.type == template_notification.container_type:
-                o.notifications.create(
-                    task_container.name, template_notification.notification
-                )
-
-    job = o.jobs.create_with_config(config.job)
-    tasks = []
-    for task_config in config.tasks:
-        task_config.job_id = job.job_id
-        if task_config.prereq_tasks:
-            # the model checker verifies prereq_tasks in u128 form are index refs to
-            # previously generated tasks
-            task_config.prereq_tasks = [
-                tasks[x.int].task_id for x in task_config.prereq_tasks
-            ]
-        tasks.append(o.tasks.create_with_config(task_config))
+    # each backend call is traced, for sinks registered with `add_sink`
+    submit.execute(request, config, TracedBackend(OnefuzzBackend(o)))
 
 
 def check(config: OnefuzzTemplate) -> None:
@@ -49,11 +36,12 @@ def main() -> None:
     import logging
 
     logging.basicConfig(level=logging.DEBUG)
+    add_sink(LoggingSink())
     template = get_template("libfuzzer_basic")
     # print("template:\n", template.json(indent=4))
 
     for_cli = build_input_config(template)
-    print("fields for CLI:", for_cli.json(indent=4))
+    print("fields for CLI:", dumps(for_cli, indent=4))
 
     request = OnefuzzTemplateRequest(
         template_name="libfuzzer",
@@ -76,7 +64,7 @@ def main() -> None:
         ],
     )
 
-    print("request:\n", request.json(indent=4))
+    print("request:\n", dumps(request, indent=4))
 
     rendered = render(request, template)
     check(rendered)
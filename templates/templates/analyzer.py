@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+
+from enum import Enum
+from typing import Any, List, NamedTuple, Optional
+
+from jsonpointer import JsonPointerException
+from pydantic import BaseModel
+from pydantic.fields import (
+    SHAPE_DEFAULTDICT,
+    SHAPE_DICT,
+    SHAPE_FROZENSET,
+    SHAPE_LIST,
+    SHAPE_MAPPING,
+    SHAPE_SEQUENCE,
+    SHAPE_SET,
+    SHAPE_SINGLETON,
+    SHAPE_TUPLE_ELLIPSIS,
+    ModelField,
+)
+from pydantic.utils import lenient_issubclass
+
+from .enums import UserFieldOperation, UserFieldType
+from .template import CompiledTemplate, PatchOp
+
+LIST_SHAPES = {
+    SHAPE_LIST,
+    SHAPE_SET,
+    SHAPE_FROZENSET,
+    SHAPE_SEQUENCE,
+    SHAPE_TUPLE_ELLIPSIS,
+}
+DICT_SHAPES = {SHAPE_DICT, SHAPE_MAPPING, SHAPE_DEFAULTDICT}
+
+# locations within these paths change what the root validators of
+# `OnefuzzTemplate` check
+ROOT_VALIDATED = [["user_fields"], ["tasks", None, "prereq_tasks"]]
+
+
+class TemplateIssue(NamedTuple):
+    field: str
+    path: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.field} ({self.path}): {self.message}"
+
+
+def check_location(document: Any, op: PatchOp) -> Optional[str]:
+    # whether `op` can be applied to the template, equivalent to the checks
+    # made by `apply_op` when rendering
+    parts = op.pointer.parts
+    if not parts:
+        return "unable to patch document root"
+
+    node = document
+    for part in parts[:-1]:
+        try:
+            node = op.pointer.walk(node, part)
+        except JsonPointerException as err:
+            return str(err)
+
+    last = parts[-1]
+    if isinstance(node, list):
+        if last == "-":
+            if op.op == UserFieldOperation.replace:
+                return "can't replace outside of list"
+            return None
+        if not last.isdigit():
+            return f"invalid list index: {last}"
+        size = len(node) if op.op == UserFieldOperation.replace else len(node) + 1
+        if int(last) >= size:
+            return f"can't {op.op.name} outside of list"
+    elif isinstance(node, dict):
+        if op.op == UserFieldOperation.replace and last not in node:
+            return f"can't replace a non-existent object '{last}'"
+    else:
+        return f"unable to fully resolve json pointer {op.path}, part {last}"
+    return None
+
+
+def accepts_str(target: ModelField) -> bool:
+    # strings can be parsed into most scalar types, such as UUIDs and enums,
+    # but not into numbers, bools or models
+    kind = target.type_
+    if lenient_issubclass(kind, (str, Enum)):
+        return True
+    return not lenient_issubclass(kind, (bool, int, float, BaseModel, dict, list))
+
+
+def check_type(field_type: UserFieldType, target: ModelField) -> Optional[str]:
+    if field_type == UserFieldType.Bool:
+        compatible = not target.validate(True, {}, loc="")[1]
+    elif field_type == UserFieldType.Int:
+        compatible = not target.validate(1, {}, loc="")[1]
+    elif field_type == UserFieldType.Str:
+        compatible = target.shape == SHAPE_SINGLETON and accepts_str(target)
+    elif field_type == UserFieldType.DictStr:
+        compatible = target.shape in DICT_SHAPES and accepts_str(target)
+    else:
+        compatible = target.shape in LIST_SHAPES and accepts_str(target)
+
+    if not compatible:
+        return f"{field_type.name} can not be patched into {target.outer_type_}"
+    return None
+
+
+def is_root_validated(op: PatchOp) -> bool:
+    parts = op.pointer.parts
+    for prefix in ROOT_VALIDATED:
+        size = min(len(prefix), len(parts))
+        if all(x is None or x == y for x, y in zip(prefix[:size], parts[:size])):
+            return True
+    return False
+
+
+def analyze_template(compiled: CompiledTemplate) -> List[TemplateIssue]:
+    # every location is checked against the template on its own, so issues
+    # that depend on which optional fields a request includes, such as
+    # inserting into a list at an index another field inserts before, are not
+    # found
+    issues = []
+    for name, entry in compiled.fields.items():
+        for op in entry.ops:
+            message = check_location(compiled.document, op)
+            if message is None and op.target is not None:
+                message = check_type(entry.field.type, op.target)
+            if message is not None:
+                issues.append(TemplateIssue(field=name, path=op.path, message=message))
+    return issues
+
+
+def trust_template(compiled: CompiledTemplate) -> CompiledTemplate:
+    # raises if any location can not be applied to the template.  otherwise,
+    # when rendering can not affect the root validators, they are no longer
+    # run on rendered output.
+    issues = analyze_template(compiled)
+    if issues:
+        raise Exception(
+            "invalid template locations: " + "; ".join(str(x) for x in issues)
+        )
+
+    compiled.trusted = not compiled.strict_only and not any(
+        is_root_validated(op) for x in compiled.fields.values() for op in x.ops
+    )
+    return compiled
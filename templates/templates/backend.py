@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from uuid import UUID, uuid4
+
+from onefuzztypes.enums import OS
+from onefuzztypes.models import (
+    Job,
+    JobConfig,
+    Notification,
+    NotificationConfig,
+    Task,
+    TaskConfig,
+)
+from onefuzztypes.primitives import Container
+
+
+class Backend(ABC):
+    # the OneFuzz service calls used to submit a rendered template
+
+    @abstractmethod
+    def create_notification(
+        self, container: Container, config: NotificationConfig
+    ) -> Notification: ...
+
+    @abstractmethod
+    def create_job(self, config: JobConfig) -> Job: ...
+
+    @abstractmethod
+    def create_task(self, config: TaskConfig) -> Task: ...
+
+
+class OnefuzzBackend(Backend):
+    def __init__(self, onefuzz: Optional[Any] = None) -> None:
+        if onefuzz is None:
+            from onefuzz.api import Onefuzz
+
+            onefuzz = Onefuzz()
+        self.onefuzz = onefuzz
+
+    def create_notification(
+        self, container: Container, config: NotificationConfig
+    ) -> Notification:
+        return self.onefuzz.notifications.create(container, config)
+
+    def create_job(self, config: JobConfig) -> Job:
+        return self.onefuzz.jobs.create_with_config(config)
+
+    def create_task(self, config: TaskConfig) -> Task:
+        return self.onefuzz.tasks.create_with_config(config)
+
+
+class BackendError(Exception):
+    pass
+
+
+class BackendCall(NamedTuple):
+    method: str
+    args: Tuple[Any, ...]
+    start: float
+    end: float
+    error: Optional[str]
+
+
+class FakeBackend(Backend):
+    # in-memory stand-in for the OneFuzz service.
+    #
+    # every call sleeps for `latency` plus up to `jitter` seconds, and fails
+    # with a BackendError with probability `failure_rate`, or always once
+    # `fail_after` calls have succeeded.  calls are recorded in `calls`.
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        fail_after: Optional[int] = None,
+        os: OS = OS.linux,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.fail_after = fail_after
+        self.os = os
+
+        self.calls: List[BackendCall] = []
+        self.notifications: Dict[UUID, Notification] = {}
+        self.jobs: Dict[UUID, Job] = {}
+        self.tasks: Dict[UUID, Task] = {}
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._succeeded = 0
+
+    def _call(self, method: str, *args: Any) -> None:
+        with self._lock:
+            delay = self.latency + self._random.uniform(0, self.jitter)
+            failed = self._random.random() < self.failure_rate or (
+                self.fail_after is not None and self._succeeded >= self.fail_after
+            )
+            if not failed:
+                self._succeeded += 1
+
+        start = time.perf_counter()
+        if delay:
+            time.sleep(delay)
+        end = time.perf_counter()
+
+        error = f"injected failure: {method}" if failed else None
+        with self._lock:
+            self.calls.append(BackendCall(method, args, start, end, error))
+        if error:
+            raise BackendError(error)
+
+    def create_notification(
+        self, container: Container, config: NotificationConfig
+    ) -> Notification:
+        self._call("create_notification", container, config)
+        notification = Notification(container=container, config=config.config)
+        with self._lock:
+            self.notifications[notification.notification_id] = notification
+        return notification
+
+    def create_job(self, config: JobConfig) -> Job:
+        self._call("create_job", config)
+        job = Job(job_id=uuid4(), config=config)
+        with self._lock:
+            self.jobs[job.job_id] = job
+        return job
+
+    def create_task(self, config: TaskConfig) -> Task:
+        self._call("create_task", config)
+        if config.job_id not in self.jobs:
+            raise BackendError(f"unable to find job: {config.job_id}")
+        for prereq in config.prereq_tasks or []:
+            if prereq not in self.tasks:
+                raise BackendError(f"unable to find prereq task: {prereq}")
+
+        task = Task(job_id=config.job_id, task_id=uuid4(), os=self.os, config=config)
+        with self._lock:
+            self.tasks[task.task_id] = task
+        return task
+
+    def latencies(self, method: Optional[str] = None) -> List[float]:
+        return [
+            x.end - x.start for x in self.calls if method is None or x.method == method
+        ]
@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+
+import argparse
+import csv
+import json
+import sys
+from collections import deque
+from itertools import islice
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from onefuzztypes.enums import ContainerType
+from onefuzztypes.models import TaskContainers
+from pydantic.json import pydantic_encoder
+
+from .enums import UserFieldOperation, UserFieldType
+from .models import TEMPLATE_USER_DATA
+from .stream import RenderedLine, get_compiled, write_stream
+from .template import (
+    CompiledTemplate,
+    PatchOp,
+    container_slots,
+    patch_tree,
+    validate_value,
+)
+
+# CSV columns with this prefix name the container of the given type
+CONTAINER_COLUMN = "container:"
+
+
+class Marker:
+    # stands in for a stamped value while the skeleton is serialized
+    def __init__(self, key: "StampKey") -> None:
+        self.key = key
+
+
+# a value stamped into the skeleton: a field's value, serialized for one of
+# its locations, or the name of the containers of a type
+StampKey = Union[Tuple[str, str], ContainerType]
+
+
+# the column a container name comes from: a field, or a container type
+StampSource = Union[str, ContainerType]
+
+
+class Skeleton(NamedTuple):
+    # rendered JSON is segments[0] + stamps[0] + segments[1] + stamps[1] ...
+    segments: List[str]
+    stamps: List[StampKey]
+
+
+def container_name_of(op: PatchOp) -> Optional[Tuple[int, int]]:
+    # the (task index, container index) whose name `op` sets, if any
+    parts = op.pointer.parts
+    if (
+        len(parts) == 5
+        and parts[0] == "tasks"
+        and parts[2] == "containers"
+        and parts[4] == "name"
+        and parts[1].isdigit()
+        and parts[3].isdigit()
+    ):
+        return (int(parts[1]), int(parts[3]))
+    return None
+
+
+def is_stampable(
+    compiled: CompiledTemplate, op: PatchOp, paths: List[List[str]]
+) -> bool:
+    # locations within task containers change which containers are bound,
+    # other than setting the name of a container the template names.  a
+    # location within another's value would be overwritten by it.
+    parts = op.pointer.parts
+    if parts[0] == "tasks" and (len(parts) < 3 or parts[2] == "containers"):
+        position = container_name_of(op)
+        if position is None or op.op != UserFieldOperation.replace:
+            return False
+        task_idx, container_idx = position
+        tasks = compiled.template.tasks
+        if task_idx >= len(tasks) or container_idx >= len(tasks[task_idx].containers):
+            return False
+        if not tasks[task_idx].containers[container_idx].name:
+            return False
+    for other in paths:
+        if other is parts:
+            continue
+        size = min(len(other), len(parts))
+        if other[:size] == parts[:size]:
+            return False
+    return True
+
+
+def build_skeleton(compiled: CompiledTemplate, fields: List[str]) -> Skeleton:
+    # the template is patched with markers at each location of `fields` and
+    # for each unnamed container, serialized the same way rendered templates
+    # are, then split at the markers
+    paths = [op.pointer.parts for x in compiled.fields.values() for op in x.ops]
+    ops = []
+    for name in fields:
+        for op in compiled.fields[name].ops:
+            if not is_stampable(compiled, op, paths):
+                raise Exception(f"field can not be rendered by column: {name}")
+            ops.append((op, Marker((name, op.path))))
+
+    slots = container_slots(compiled.template)
+    names = {x[2]: Marker(x[2]) for x in slots}
+    document = patch_tree(compiled.document, ops)
+    document = patch_tree(document, compiled.binding_ops(slots, names))
+
+    markers: List[StampKey] = []
+
+    def encode(marker: Marker) -> str:
+        markers.append(marker.key)
+        return f"\0stamp-{len(markers) - 1}\0"
+
+    text = json.dumps(document, default=encode)
+    head, *chunks = text.split('"\\u0000stamp-')
+    segments = [head]
+    stamps = []
+    for chunk in chunks:
+        index, rest = chunk.split('\\u0000"', 1)
+        stamps.append(markers[int(index)])
+        segments.append(rest)
+    return Skeleton(segments=segments, stamps=stamps)
+
+
+class ColumnarRenderer:
+    # renders batches of requests that all provide the same fields, given as
+    # one sequence of values per field, straight to rendered JSON.
+    #
+    # each column is validated on its own, values repeated within a column
+    # are validated and serialized once, and rows are rendered by joining
+    # the serialized values with the fixed parts of the pre-serialized
+    # template.  no models are built per row, so this requires a template
+    # checked by `analyzer.trust_template`, as the root validators are not
+    # run.  output is identical to `CompiledTemplate.render(request).json()`.
+
+    def __init__(
+        self,
+        compiled: CompiledTemplate,
+        fields: Sequence[str],
+        containers: Sequence[TaskContainers] = (),
+        container_columns: Sequence[ContainerType] = (),
+    ) -> None:
+        if not compiled.trusted:
+            raise Exception("columnar rendering requires a trusted template")
+
+        for name in fields:
+            if name not in compiled.fields:
+                raise ValueError(f"extra field: {name}")
+        for name, entry in compiled.fields.items():
+            if entry.field.required and name not in fields:
+                raise ValueError(f"missing required field: {name}")
+
+        self.compiled = compiled
+        self.fields = [x for x in compiled.fields if x in fields]
+        self.names = {x.type: x.name for x in containers}
+        self.container_columns = list(container_columns)
+
+        # containers are checked as in `container_names`, other than names
+        # from columns, which are checked per row
+        self.slot_types = set(x[2] for x in container_slots(compiled.template))
+        provided = set(self.names) | set(self.container_columns)
+        for container_type in self.slot_types:
+            if container_type not in provided:
+                raise Exception(f"missing container definition {container_type}")
+        for container_type in provided:
+            if container_type not in self.slot_types:
+                raise Exception(f"unused container in request: {container_type}")
+        for container_type, name in self.names.items():
+            if not name and container_type not in self.container_columns:
+                raise Exception(f"missing container definition {container_type}")
+
+        self.skeleton = build_skeleton(compiled, self.fields)
+
+        # rendering fails for the first container, in template order, that
+        # is left without a name
+        named: Dict[Tuple[int, int], str] = {}
+        for name in self.fields:
+            for op in compiled.fields[name].ops:
+                position = container_name_of(op)
+                if position is not None:
+                    named[position] = name
+        self.container_checks: List[Tuple[ContainerType, StampSource]] = []
+        for task_idx, task in enumerate(compiled.template.tasks):
+            for container_idx, container in enumerate(task.containers):
+                field = named.get((task_idx, container_idx))
+                if field is not None:
+                    self.container_checks.append((container.type, field))
+                elif not container.name and container.type in self.container_columns:
+                    self.container_checks.append((container.type, container.type))
+
+    def render_columns(
+        self,
+        columns: Mapping[str, Sequence[TEMPLATE_USER_DATA]],
+        container_columns: Optional[Mapping[ContainerType, Sequence[str]]] = None,
+    ) -> List[RenderedLine]:
+        container_columns = container_columns or {}
+        sizes = set(len(columns[x]) for x in self.fields)
+        sizes |= set(len(container_columns[x]) for x in self.container_columns)
+        if len(sizes) > 1:
+            raise Exception("columns must have the same length")
+        count = sizes.pop() if sizes else 1
+
+        # fields are checked in the same order as `build_ops`, before any
+        # value is validated against its model field, so a row with several
+        # invalid values reports the same error as `render`
+        errors: List[Optional[str]] = [None] * count
+        for name in self.fields:
+            self.check_field(name, columns[name], errors)
+
+        stamped: Dict[StampKey, List[str]] = {}
+        for name in self.fields:
+            for op in self.compiled.fields[name].ops:
+                stamped[(name, op.path)] = self.stamp_field(op, columns[name], errors)
+        for container_type in self.slot_types:
+            if container_type in container_columns:
+                stamped[container_type] = [
+                    json.dumps(x) for x in container_columns[container_type]
+                ]
+            else:
+                name = json.dumps(self.names[container_type])
+                stamped[container_type] = [name] * count
+
+        for container_type, source in self.container_checks:
+            if isinstance(source, ContainerType):
+                names: Sequence[Any] = container_columns[source]
+            else:
+                names = columns[source]
+            for row, name in enumerate(names):
+                if name == "" and errors[row] is None:
+                    errors[row] = (
+                        f"Exception: missing container definition {container_type}"
+                    )
+
+        segments = self.skeleton.segments
+        values = [stamped[x] for x in self.skeleton.stamps]
+        results: List[RenderedLine] = []
+        for row in range(count):
+            error = errors[row]
+            if error is not None:
+                results.append((False, error))
+                continue
+            parts = [segments[0]]
+            for column, segment in zip(values, segments[1:]):
+                parts.append(column[row])
+                parts.append(segment)
+            results.append((True, "".join(parts)))
+        return results
+
+    def check_field(
+        self,
+        name: str,
+        values: Sequence[TEMPLATE_USER_DATA],
+        errors: List[Optional[str]],
+    ) -> None:
+        validator = self.compiled.validators[name]
+        valid = set()
+        for row, value in enumerate(values):
+            key = memo_key(value)
+            if key is not None and key in valid:
+                continue
+            try:
+                validator(value)
+            except Exception as err:
+                if errors[row] is None:
+                    errors[row] = f"{type(err).__name__}: {err}"
+                continue
+            if key is not None:
+                valid.add(key)
+
+    def stamp_field(
+        self,
+        op: PatchOp,
+        values: Sequence[TEMPLATE_USER_DATA],
+        errors: List[Optional[str]],
+    ) -> List[str]:
+        # values are validated against the model field at `op` and
+        # serialized as they would be in the rendered template
+        seen: Dict[Tuple[type, Hashable], str] = {}
+        column = []
+        for row, value in enumerate(values):
+            if errors[row] is not None:
+                column.append("")
+                continue
+
+            key = memo_key(value)
+            text = seen.get(key) if key is not None else None
+            if text is None:
+                try:
+                    validated = validate_value(op, value)
+                except Exception as err:
+                    errors[row] = f"{type(err).__name__}: {err}"
+                    column.append("")
+                    continue
+                text = json.dumps(validated, default=pydantic_encoder)
+                if key is not None:
+                    seen[key] = text
+            column.append(text)
+        return column
+
+
+def memo_key(value: Any) -> Optional[Tuple[type, Hashable]]:
+    # True == 1, but they are validated and rendered differently
+    if isinstance(value, Hashable):
+        return (type(value), value)
+    return None
+
+
+def parse_cell(field_type: UserFieldType, text: str) -> Any:
+    # DictStr and ListStr cells hold JSON, other cells hold the value itself.
+    # values that can not be parsed are passed on as text, to fail validation
+    try:
+        if field_type == UserFieldType.Int:
+            return int(text)
+        if field_type == UserFieldType.Bool and text.lower() in ["true", "false"]:
+            return text.lower() == "true"
+        if field_type in [UserFieldType.DictStr, UserFieldType.ListStr]:
+            return json.loads(text)
+    except ValueError:
+        pass
+    return text
+
+
+def render_csv(
+    rows: Iterable[Dict[str, str]],
+    header: Sequence[str],
+    compiled: CompiledTemplate,
+    containers: Sequence[TaskContainers] = (),
+    chunk_size: int = 1024,
+) -> Iterator[RenderedLine]:
+    # rows are rendered `chunk_size` at a time, so memory use does not grow
+    # with the size of the input
+    fields = [x for x in header if not x.startswith(CONTAINER_COLUMN)]
+    container_columns = [
+        ContainerType(x[len(CONTAINER_COLUMN) :])
+        for x in header
+        if x.startswith(CONTAINER_COLUMN)
+    ]
+    renderer = ColumnarRenderer(compiled, fields, containers, container_columns)
+    types = {x: compiled.fields[x].field.type for x in renderer.fields}
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        columns = {
+            name: [parse_cell(types[name], x[name]) for x in chunk]
+            for name in renderer.fields
+        }
+        names = {
+            x: [row[CONTAINER_COLUMN + x.name] for row in chunk]
+            for x in container_columns
+        }
+        yield from renderer.render_columns(columns, names)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="render a CSV file of user fields, one row per request, "
+        "into OnefuzzTemplate JSON lines"
+    )
+    parser.add_argument(
+        "input",
+        nargs="?",
+        type=argparse.FileType("r"),
+        default=sys.stdin,
+        help="CSV file with a header row of field names, and "
+        f"'{CONTAINER_COLUMN}<type>' for container names. defaults to stdin",
+    )
+    parser.add_argument("--template", required=True)
+    parser.add_argument(
+        "--container",
+        action="append",
+        default=[],
+        metavar="TYPE=NAME",
+        help="container used by every row",
+    )
+    parser.add_argument(
+        "--output",
+        type=argparse.FileType("w"),
+        default=sys.stdout,
+        help="JSONL file for rendered templates, defaults to stdout",
+    )
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    containers = []
+    for entry in args.container:
+        container_type, _, name = entry.partition("=")
+        containers.append(TaskContainers(type=container_type, name=name))
+
+    # rows are read ahead of their results, so the line each row ended on is
+    # kept until its result is written
+    reader = csv.DictReader(args.input)
+    numbers: Deque[int] = deque()
+
+    def rows() -> Iterator[Dict[str, str]]:
+        for row in reader:
+            numbers.append(reader.line_num)
+            yield row
+
+    results = render_csv(
+        rows(),
+        reader.fieldnames or [],
+        get_compiled(args.template),
+        containers,
+        chunk_size=args.chunk_size,
+    )
+    failed = write_stream(
+        ((numbers.popleft(), x) for x in results), args.output, sys.stderr
+    )
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
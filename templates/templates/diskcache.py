@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+import logging
+import mmap
+import os
+import pickle
+import tempfile
+from hashlib import sha256
+from typing import List, NamedTuple, Optional
+
+import pydantic
+from onefuzztypes.__version__ import __version__ as onefuzztypes_version
+
+from . import analyzer, enums, models, template
+from .models import OnefuzzTemplate
+from .template import CompiledTemplate, InputConfig
+
+# bumped whenever the layout of `CachedTemplate` changes
+CACHE_FORMAT = 1
+
+CACHE_DIR_ENV = "ONEFUZZ_TEMPLATE_CACHE"
+
+# the modules defining the types pickled in `CachedTemplate`, and analyzer.py,
+# which decides the `trusted` flag pickled with compiled templates
+LAYOUT_SOURCES = [
+    analyzer.__file__,
+    enums.__file__,
+    models.__file__,
+    template.__file__,
+]
+
+
+class CachedTemplate(NamedTuple):
+    template: OnefuzzTemplate
+    template_hash: str
+    input_config: InputConfig
+    compiled: CompiledTemplate
+
+
+def default_cache_dir() -> Optional[str]:
+    # setting the environment variable to an empty string disables the cache
+    path = os.environ.get(CACHE_DIR_ENV)
+    if path is None:
+        path = os.path.join(os.path.expanduser("~"), ".cache", "onefuzz-templates")
+    return path or None
+
+
+class DiskCache:
+    # pickled templates, along with their input config and compiled patch
+    # plan, stored under a directory named for a hash of the source files
+    # that define them and the library versions that validated them.
+    #
+    # any change to those sources or versions, or to the modules defining the
+    # pickled types, results in a new directory, so entries are never
+    # invalidated in place.
+
+    def __init__(self, root: str, sources: List[str]) -> None:
+        digest = sha256()
+        for part in [
+            str(CACHE_FORMAT),
+            onefuzztypes_version,
+            pydantic.VERSION,
+        ]:
+            digest.update(part.encode() + b"\0")
+        for source in LAYOUT_SOURCES + sources:
+            with open(source, "rb") as handle:
+                digest.update(handle.read())
+        self.key = digest.hexdigest()
+        self.path = os.path.join(root, self.key)
+
+    def _entry_path(self, name: str) -> str:
+        return os.path.join(self.path, f"{name}.pickle")
+
+    def load(self, name: str) -> Optional[CachedTemplate]:
+        try:
+            with open(self._entry_path(name), "rb") as handle:
+                with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    entry = pickle.loads(data)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logging.debug("unable to load cached template %s: %s", name, err)
+            return None
+
+        if not isinstance(entry, CachedTemplate):
+            return None
+        return entry
+
+    def save(self, name: str, entry: CachedTemplate) -> None:
+        # written to a temporary file and renamed into place, so concurrent
+        # readers never see a partial entry
+        tmp_path = None
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            handle, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+            with os.fdopen(handle, "wb") as tmp:
+                pickle.dump(entry, tmp, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._entry_path(name))
+        except Exception as err:
+            logging.debug("unable to cache template %s: %s", name, err)
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from onefuzztypes.models import Job, Task, TaskConfig
+
+from .backend import Backend
+from .journal import SubmissionJournal, SubmissionProgress
+from .models import OnefuzzTemplateRequest
+from .notifications import NotificationPlanner, notification_targets
+from .template import Rendered
+
+
+def task_prereqs(tasks: Sequence[TaskConfig]) -> List[List[int]]:
+    # the model checker verifies prereq_tasks in u128 form are index refs to
+    # previously generated tasks
+    return [[x.int for x in (task.prereq_tasks or [])] for task in tasks]
+
+
+def task_payload(config: TaskConfig, job: Job, prereqs: List[Task]) -> TaskConfig:
+    update: Dict[str, Any] = {"job_id": job.job_id}
+    if prereqs:
+        update["prereq_tasks"] = [x.task_id for x in prereqs]
+    return config.copy(update=update)
+
+
+def execute(
+    request: OnefuzzTemplateRequest,
+    config: Rendered,
+    backend: Backend,
+    max_workers: int = 8,
+    executor: Optional[Executor] = None,
+    journal: Optional[SubmissionJournal] = None,
+    notifications: bool = True,
+) -> Tuple[Job, List[Task]]:
+    # notifications, the job and every task whose prereqs have been created
+    # are submitted concurrently, with at most `max_workers` calls in flight.
+    # a task is only held back until the tasks it depends on have task_ids.
+    #
+    # `config` is only read: each task is submitted as a copy carrying the
+    # job_id and prereq task_ids of this submission, so one rendered template
+    # can be retried, cached or submitted from several threads at once.
+    #
+    # calls may instead be run on a shared `executor`, such as one sized for
+    # the backend's connection pool.  it must not be the executor `execute`
+    # itself is running on, as `execute` waits for the calls it submits.
+    #
+    # with a `journal`, each call is recorded as it succeeds.  executing a
+    # request that failed part way through again only makes the calls that
+    # did not succeed, with prereq_tasks mapped to the recorded task_ids.
+    # the records are dropped once the request is completed.
+    #
+    # `notifications` may be disabled when they have already been created,
+    # such as by a `NotificationPlanner`.
+    if executor is None:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return execute(
+                request,
+                config,
+                backend,
+                executor=executor,
+                journal=journal,
+                notifications=notifications,
+            )
+
+    if journal is not None:
+        progress = journal.resume(request, config)
+    else:
+        progress = SubmissionProgress()
+    # a `RenderedTemplate` copies its tasks on each access
+    task_configs = config.tasks
+    prereqs = task_prereqs(task_configs)
+
+    targets = notification_targets(request, config) if notifications else []
+    created = [
+        executor.submit(
+            progress.run,
+            "notification",
+            idx,
+            backend.create_notification,
+            container,
+            notification,
+        )
+        for idx, (container, notification) in enumerate(targets)
+        if idx not in progress.notifications
+    ]
+
+    if progress.job_id is None:
+        job = executor.submit(
+            progress.run, "job", 0, backend.create_job, config.job
+        ).result()
+    else:
+        job = Job.construct(job_id=progress.job_id, config=config.job)
+
+    # the journal only holds ids, so the job and tasks created by earlier
+    # attempts are rebuilt without the state the service returned for them.
+    # prereqs always come before the tasks that depend on them.
+    tasks: Dict[int, Task] = {}
+    for idx in sorted(progress.tasks):
+        tasks[idx] = Task.construct(
+            job_id=job.job_id,
+            task_id=progress.tasks[idx],
+            config=task_payload(
+                task_configs[idx], job, [tasks[x] for x in prereqs[idx]]
+            ),
+        )
+    pending: Dict[Future, int] = {}
+    unscheduled = [x for x in range(len(task_configs)) if x not in tasks]
+
+    while unscheduled or pending:
+        for idx in list(unscheduled):
+            if any(x not in tasks for x in prereqs[idx]):
+                continue
+            unscheduled.remove(idx)
+
+            future = executor.submit(
+                progress.run,
+                "task",
+                idx,
+                backend.create_task,
+                task_payload(task_configs[idx], job, [tasks[x] for x in prereqs[idx]]),
+            )
+            pending[future] = idx
+
+        if not pending:
+            raise Exception(f"unable to schedule tasks: {unscheduled}")
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            tasks[pending.pop(future)] = future.result()
+
+    for future in created:
+        future.result()
+
+    progress.finish()
+    return job, [tasks[x] for x in range(len(task_configs))]
+
+
+def execute_many(
+    submissions: Iterable[Tuple[OnefuzzTemplateRequest, Rendered]],
+    backend: Backend,
+    max_workers: int = 8,
+    planner: Optional[NotificationPlanner] = None,
+    journal: Optional[SubmissionJournal] = None,
+) -> List[Tuple[Job, List[Task]]]:
+    # the notifications needed by the whole batch are created first, each
+    # distinct container and config once, then every job is submitted in turn
+    # without creating notifications again.  a `planner` kept between batches
+    # also skips notifications created by earlier batches.
+    submissions = list(submissions)
+    if planner is None:
+        planner = NotificationPlanner(backend, max_workers=max_workers)
+    planner.create(submissions)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return [
+            execute(
+                request,
+                config,
+                backend,
+                executor=executor,
+                journal=journal,
+                notifications=False,
+            )
+            for request, config in submissions
+        ]
@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+
+import os
+import tempfile
+import threading
+import time
+from hashlib import sha256
+from typing import Any, Callable, Dict, List, Optional, TypeVar, Union
+from uuid import UUID
+
+from .models import OnefuzzTemplate, OnefuzzTemplateRequest
+from .serialize import encode, loads
+from .template import RenderedTemplate, request_hash
+
+T = TypeVar("T")
+
+# the field holding the id of the result of each kind of call
+ID_FIELDS = {"notification": "notification_id", "job": "job_id", "task": "task_id"}
+
+
+def submission_key(
+    request: OnefuzzTemplateRequest,
+    config: Union[OnefuzzTemplate, RenderedTemplate],
+) -> str:
+    # a request rendered from a changed template is a new submission
+    if isinstance(config, RenderedTemplate):
+        config = config.to_model()
+    digest = sha256(request_hash(request).encode() + b":")
+    digest.update(encode(config, sort_keys=True))
+    return digest.hexdigest()
+
+
+class SubmissionProgress:
+    # the ids of the notifications, job and tasks created so far for one
+    # submission, recorded in `journal` as each call succeeds.  notifications
+    # and tasks are keyed by their index in the order `execute` creates them.
+    #
+    # only ids are recorded, as the results of calls can hold secrets, such
+    # as the webhook URLs of notifications.
+
+    def __init__(
+        self, key: str = "", journal: Optional["SubmissionJournal"] = None
+    ) -> None:
+        self.key = key
+        self.journal = journal
+        self.notifications: Dict[int, UUID] = {}
+        self.job_id: Optional[UUID] = None
+        self.tasks: Dict[int, UUID] = {}
+
+    def load(self, kind: str, index: int, value: UUID) -> None:
+        if kind == "notification":
+            self.notifications[index] = value
+        elif kind == "job":
+            self.job_id = value
+        elif kind == "task":
+            self.tasks[index] = value
+        else:
+            raise ValueError(f"invalid journal record: {kind}")
+
+    def run(self, kind: str, index: int, func: Callable[..., T], *args: Any) -> T:
+        # makes the call, then records the id of its result before returning it
+        result = func(*args)
+        value = getattr(result, ID_FIELDS[kind])
+        if self.journal is not None:
+            self.journal.append(self.key, kind, index, value)
+        self.load(kind, index, value)
+        return result
+
+    def finish(self) -> None:
+        # a completed submission has nothing left to resume
+        if self.journal is not None:
+            self.journal.forget(self.key)
+
+
+class SubmissionJournal:
+    # append-only log of the calls made by `execute`, so a submission that
+    # failed part way through resumes where it stopped instead of creating
+    # its notifications, job and tasks again.
+    #
+    # each line is `<submission key> <json record>`.  lines are written and
+    # flushed as each call succeeds, so they survive the process exiting, but
+    # are only fsynced once `sync_every` lines are pending or `sync_interval`
+    # seconds have passed since the last fsync, and by `sync` and `close`.
+    # records are only parsed when their submission is resumed.
+    #
+    # only unfinished submissions are kept: the records of a submission are
+    # dropped once `execute` completes it, so executing the same request again
+    # submits it again.  the lines of finished submissions are removed from
+    # the file when it is next opened.
+
+    def __init__(
+        self, path: str, sync_every: int = 256, sync_interval: float = 1.0
+    ) -> None:
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._records: Dict[str, List[bytes]] = {}
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+        if os.path.exists(path):
+            self._replay()
+        self._handle = open(path, "ab")
+
+    def _replay(self) -> None:
+        with open(self.path, "rb") as handle:
+            data = handle.read()
+
+        # a line cut short by a crash is dropped, so its call is made again on
+        # resume, and removed so later lines start on a line of their own
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            with open(self.path, "r+b") as handle:
+                handle.truncate(end)
+
+        lines = data[:end].split(b"\n")[:-1]
+        for line in lines:
+            key, record = line.split(b" ", 1)
+            if record == b"null":
+                self._records.pop(key.decode(), None)
+            else:
+                self._records.setdefault(key.decode(), []).append(record)
+
+        if len(lines) > sum(len(x) for x in self._records.values()):
+            self._compact()
+
+    def _compact(self) -> None:
+        # rewrites the file with only the records of unfinished submissions.
+        # written to a temporary file and renamed into place, so a crash
+        # leaves either the old or the new file.
+        directory = os.path.dirname(os.path.abspath(self.path))
+        handle, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as tmp:
+                for key, records in self._records.items():
+                    for record in records:
+                        tmp.write(key.encode() + b" " + record + b"\n")
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+    def resume(
+        self,
+        request: OnefuzzTemplateRequest,
+        config: Union[OnefuzzTemplate, RenderedTemplate],
+    ) -> SubmissionProgress:
+        # a submission must not be executed from two places at once
+        key = submission_key(request, config)
+        progress = SubmissionProgress(key, self)
+        with self._lock:
+            records = list(self._records.get(key, []))
+        for record in records:
+            data = loads(record)
+            progress.load(data["kind"], data["index"], UUID(data["id"]))
+        return progress
+
+    def append(self, key: str, kind: str, index: int, value: UUID) -> None:
+        record = encode({"kind": kind, "index": index, "id": value})
+        self._write(key, record)
+
+    def forget(self, key: str) -> None:
+        self._write(key, b"null")
+
+    def _write(self, key: str, record: bytes) -> None:
+        with self._lock:
+            self._handle.write(key.encode() + b" " + record + b"\n")
+            self._handle.flush()
+            if record == b"null":
+                self._records.pop(key, None)
+            else:
+                self._records.setdefault(key, []).append(record)
+
+            self._unsynced += 1
+            if (
+                self._unsynced >= self.sync_every
+                or time.monotonic() - self._synced_at >= self.sync_interval
+            ):
+                self._sync()
+
+    def _sync(self) -> None:
+        os.fsync(self._handle.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._unsynced:
+                self._sync()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._handle.closed:
+                return
+            self._sync()
+            self._handle.close()
+
+    def __enter__(self) -> "SubmissionJournal":
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        self.close()
@@ -84,6 +84,33 @@ class OnefuzzTemplateRequest(BaseModel):
     containers: List[TaskContainers]
 
 
+class OnefuzzTemplateMatrixRequest(BaseModel):
+    # renders one template per combination of the values in `matrix`, each
+    # along with the values in `user_fields`
+    template_name: str
+    user_fields: Dict[str, TEMPLATE_USER_DATA]
+    matrix: Dict[str, List[TEMPLATE_USER_DATA]]
+    containers: List[TaskContainers]
+
+    @root_validator()
+    def check_matrix(cls, data: Dict) -> Dict:
+        for name, values in data.get("matrix", {}).items():
+            if name in data.get("user_fields", {}):
+                raise Exception(f"field in both user_fields and matrix: {name}")
+            if not values:
+                raise Exception(f"no values for matrix field: {name}")
+        return data
+
+
+class OnefuzzTemplateRecord(BaseModel):
+    # enough to render a template again: the content hash of the template, as
+    # kept in a `records.TemplateStore`, the canonical request it was
+    # rendered with, and the `records.RENDER_FORMAT_VERSION` it was made for
+    template_hash: str
+    request: OnefuzzTemplateRequest
+    version: int
+
+
 class OnefuzzTemplateField(BaseModel):
     name: str
     type: UserFieldType
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from hashlib import sha256
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from onefuzztypes.models import Notification, NotificationConfig
+from onefuzztypes.primitives import Container
+
+from .backend import Backend
+from .models import OnefuzzTemplateRequest
+from .serialize import encode
+from .template import Rendered
+
+NotificationTarget = Tuple[Container, NotificationConfig]
+
+
+def notification_targets(
+    request: OnefuzzTemplateRequest, config: Rendered
+) -> List[NotificationTarget]:
+    # every request container of a type a template notification is for
+    return [
+        (task_container.name, template_notification.notification)
+        for template_notification in config.notifications
+        for task_container in request.containers
+        if task_container.type == template_notification.container_type
+    ]
+
+
+def notification_key(container: Container, config: NotificationConfig) -> str:
+    # the kind of notification is included, as Teams, ADO and GitHub configs
+    # could otherwise encode the same
+    digest = sha256(f"{container}:{type(config.config).__name__}:".encode())
+    digest.update(encode(config, sort_keys=True))
+    return digest.hexdigest()
+
+
+class NotificationPlanner:
+    # creates the notifications needed by a batch of submissions up front, so
+    # jobs can then be submitted with `execute(..., notifications=False)`.
+    #
+    # notifications are deduplicated by `notification_key` across the batch
+    # and against those already created by this planner, which are kept in
+    # `created`.  batches planned from several threads at once share the
+    # calls for the notifications they have in common.
+
+    def __init__(self, backend: Backend, max_workers: int = 8) -> None:
+        self.backend = backend
+        self.max_workers = max_workers
+        self.created: Dict[str, Notification] = {}
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def plan(
+        self, submissions: Iterable[Tuple[OnefuzzTemplateRequest, Rendered]]
+    ) -> Dict[str, NotificationTarget]:
+        # the distinct notifications needed by the batch, in the order they
+        # are first needed, including those already created
+        targets: Dict[str, NotificationTarget] = {}
+        for request, config in submissions:
+            for container, notification in notification_targets(request, config):
+                key = notification_key(container, notification)
+                if key not in targets:
+                    targets[key] = (container, notification)
+        return targets
+
+    def create(
+        self,
+        submissions: Iterable[Tuple[OnefuzzTemplateRequest, Rendered]],
+    ) -> Dict[str, Notification]:
+        # every notification is attempted.  if any fail, the first error is
+        # raised once the others finish, and those that succeeded are kept,
+        # so creating the batch again only retries the failures.
+        targets = self.plan(submissions)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures: Dict[str, Future] = {}
+            with self._lock:
+                for key, (container, notification) in targets.items():
+                    if key in self.created:
+                        continue
+                    future = self._pending.get(key)
+                    if future is None:
+                        future = executor.submit(
+                            self._create, key, container, notification
+                        )
+                        self._pending[key] = future
+                    futures[key] = future
+
+            error: Optional[Exception] = None
+            for future in futures.values():
+                try:
+                    future.result()
+                except Exception as err:
+                    error = error or err
+        if error is not None:
+            raise error
+
+        with self._lock:
+            return {key: self.created[key] for key in targets}
+
+    def _create(
+        self, key: str, container: Container, config: NotificationConfig
+    ) -> Notification:
+        try:
+            notification = self.backend.create_notification(container, config)
+        except Exception:
+            with self._lock:
+                del self._pending[key]
+            raise
+
+        with self._lock:
+            self.created[key] = notification
+            del self._pending[key]
+        return notification
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+import logging
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from hashlib import sha256
+from typing import Dict, Optional
+
+from .models import OnefuzzTemplate, OnefuzzTemplateRecord, OnefuzzTemplateRequest
+from .template import CompiledTemplate, canonical_request, compile_template
+
+# the format of rendered templates.  must be incremented by hand whenever a
+# change to rendering, the models or the onefuzztypes and pydantic versions
+# supported changes what a record renders to.
+RENDER_FORMAT_VERSION = 1
+
+
+class TemplateStore(ABC):
+    # templates keyed by `template_hash`, the sha256 of their JSON with sorted
+    # keys.  stored content is that JSON, so entries can be verified without
+    # parsing them.  compiled templates are kept for rehydrating records.
+
+    def __init__(self) -> None:
+        self._compiled: Dict[str, CompiledTemplate] = {}
+        self._lock = threading.Lock()
+
+    def put(self, template: OnefuzzTemplate) -> str:
+        data = template.json(sort_keys=True).encode()
+        digest = sha256(data).hexdigest()
+        if not self.contains(digest):
+            self.write(digest, data)
+        return digest
+
+    def get(self, digest: str) -> OnefuzzTemplate:
+        return self.compiled(digest).template
+
+    def compiled(self, digest: str) -> CompiledTemplate:
+        with self._lock:
+            compiled = self._compiled.get(digest)
+            if compiled is not None:
+                return compiled
+
+        data = self.read(digest)
+        if data is None:
+            raise KeyError(f"template not found: {digest}")
+        if sha256(data).hexdigest() != digest:
+            raise Exception(f"stored template does not match its hash: {digest}")
+        compiled = compile_template(OnefuzzTemplate.parse_raw(data))
+
+        with self._lock:
+            return self._compiled.setdefault(digest, compiled)
+
+    @abstractmethod
+    def contains(self, digest: str) -> bool: ...
+
+    @abstractmethod
+    def read(self, digest: str) -> Optional[bytes]: ...
+
+    @abstractmethod
+    def write(self, digest: str, data: bytes) -> None: ...
+
+
+class MemoryTemplateStore(TemplateStore):
+    def __init__(self) -> None:
+        super().__init__()
+        self._entries: Dict[str, bytes] = {}
+
+    def contains(self, digest: str) -> bool:
+        return digest in self._entries
+
+    def read(self, digest: str) -> Optional[bytes]:
+        return self._entries.get(digest)
+
+    def write(self, digest: str, data: bytes) -> None:
+        self._entries[digest] = data
+
+
+class DirectoryTemplateStore(TemplateStore):
+    def __init__(self, root: str) -> None:
+        super().__init__()
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, f"{digest}.json")
+
+    def contains(self, digest: str) -> bool:
+        return os.path.exists(self._path(digest))
+
+    def read(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._path(digest), "rb") as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, digest: str, data: bytes) -> None:
+        # written to a temporary file and renamed into place, so concurrent
+        # readers never see a partial entry
+        os.makedirs(self.root, exist_ok=True)
+        handle, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(handle, "wb") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, self._path(digest))
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+
+def make_record(
+    request: OnefuzzTemplateRequest, template: OnefuzzTemplate, store: TemplateStore
+) -> OnefuzzTemplateRecord:
+    return OnefuzzTemplateRecord(
+        template_hash=store.put(template),
+        request=canonical_request(request),
+        version=RENDER_FORMAT_VERSION,
+    )
+
+
+def rehydrate(
+    record: OnefuzzTemplateRecord, store: TemplateStore, check_version: bool = True
+) -> OnefuzzTemplate:
+    # renders the record's request again.  rendering is deterministic for a
+    # given template, request and `RENDER_FORMAT_VERSION`, so a record made
+    # for another format is refused unless `check_version` is False.
+    if record.version != RENDER_FORMAT_VERSION:
+        if check_version:
+            raise Exception(
+                f"record rendered with format {record.version}, "
+                f"running {RENDER_FORMAT_VERSION}"
+            )
+        logging.warning(
+            "rehydrating record from format %d with %d",
+            record.version,
+            RENDER_FORMAT_VERSION,
+        )
+    return store.compiled(record.template_hash).render(record.request)
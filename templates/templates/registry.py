@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+import threading
+from typing import Callable, Dict, Iterator, Mapping, Optional, Set, Union
+
+from .analyzer import trust_template
+from .diskcache import CachedTemplate, DiskCache
+from .models import OnefuzzTemplate
+from .template import (
+    INPUT_CONFIG_CACHE,
+    CompiledTemplate,
+    compile_template,
+    template_hash,
+)
+
+TemplateFactory = Callable[[], OnefuzzTemplate]
+
+# a template, a function that builds one, or the template's serialized JSON
+TemplateSource = Union[OnefuzzTemplate, TemplateFactory, str, bytes]
+
+
+class TemplateRegistry(Mapping[str, OnefuzzTemplate]):
+    # templates are registered as factories and only built (and validated)
+    # the first time they are looked up, after which they are cached.  field
+    # locations are checked by `trust_template` as each template is built,
+    # or at registration for templates registered already built.
+    #
+    # templates registered with `cache=True` are also stored in `disk_cache`,
+    # along with their input config and compiled form, and later processes
+    # load them from there rather than calling the factory.  only templates
+    # defined by the sources `disk_cache` is keyed on should be cached.
+
+    def __init__(self, disk_cache: Optional[DiskCache] = None) -> None:
+        self.disk_cache = disk_cache
+        self._factories: Dict[str, TemplateFactory] = {}
+        self._templates: Dict[str, OnefuzzTemplate] = {}
+        self._compiled: Dict[str, CompiledTemplate] = {}
+        self._cacheable: Set[str] = set()
+        self._lock = threading.RLock()
+
+    def register(self, name: str, source: TemplateSource, cache: bool = False) -> None:
+        factory: TemplateFactory
+        if isinstance(source, OnefuzzTemplate):
+            template = source
+            factory = lambda: template  # noqa: E731
+        elif isinstance(source, (str, bytes)):
+            blob = source
+            factory = lambda: OnefuzzTemplate.parse_raw(blob)  # noqa: E731
+        else:
+            factory = source
+
+        compiled = None
+        if isinstance(source, OnefuzzTemplate):
+            compiled = trust_template(compile_template(source))
+
+        with self._lock:
+            self._factories[name] = factory
+            self._templates.pop(name, None)
+            self._compiled.pop(name, None)
+            if compiled is not None:
+                self._templates[name] = compiled.template
+                self._compiled[name] = compiled
+            if cache:
+                self._cacheable.add(name)
+            else:
+                self._cacheable.discard(name)
+        INPUT_CONFIG_CACHE.invalidate(name)
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            del self._factories[name]
+            self._templates.pop(name, None)
+            self._compiled.pop(name, None)
+            self._cacheable.discard(name)
+        INPUT_CONFIG_CACHE.invalidate(name)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        # built templates are dropped, and rebuilt from their factory on the
+        # next lookup
+        with self._lock:
+            if name is None:
+                self._templates.clear()
+                self._compiled.clear()
+            else:
+                self._templates.pop(name, None)
+                self._compiled.pop(name, None)
+        INPUT_CONFIG_CACHE.invalidate(name)
+
+    def is_built(self, name: str) -> bool:
+        return name in self._templates
+
+    def __getitem__(self, name: str) -> OnefuzzTemplate:
+        template = self._templates.get(name)
+        if template is not None:
+            return template
+
+        with self._lock:
+            template = self._templates.get(name)
+            if template is None:
+                template = self._build(name)
+            return template
+
+    def _build(self, name: str) -> OnefuzzTemplate:
+        factory = self._factories[name]
+        if self.disk_cache is None or name not in self._cacheable:
+            template = factory()
+            compiled = trust_template(compile_template(template))
+            self._templates[name] = template
+            self._compiled[name] = compiled
+            return template
+
+        entry = self.disk_cache.load(name)
+        if entry is None:
+            template = factory()
+            entry = CachedTemplate(
+                template=template,
+                template_hash=template_hash(template),
+                input_config=INPUT_CONFIG_CACHE.get(name, template),
+                compiled=trust_template(compile_template(template)),
+            )
+            self.disk_cache.save(name, entry)
+        else:
+            INPUT_CONFIG_CACHE.put(
+                name, entry.template, entry.template_hash, entry.input_config
+            )
+
+        self._templates[name] = entry.template
+        self._compiled[name] = entry.compiled
+        return entry.template
+
+    def compiled(self, name: str) -> CompiledTemplate:
+        compiled = self._compiled.get(name)
+        if compiled is not None:
+            return compiled
+
+        # templates are compiled as they are built
+        with self._lock:
+            self[name]
+            return self._compiled[name]
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._factories
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._factories))
+
+    def __len__(self) -> int:
+        return len(self._factories)
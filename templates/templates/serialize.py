@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+import json
+from typing import Any, Optional, Union
+
+from onefuzztypes.enums import ContainerType
+from onefuzztypes.models import TaskContainers
+from pydantic import BaseModel
+from pydantic.json import pydantic_encoder
+
+from .models import OnefuzzTemplateRequest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# models are encoded from their `__dict__`, skipping the conversion to dicts
+# of dicts that `BaseModel.json` makes first.  the result parses to the same
+# document as `BaseModel.json`, though orjson does not add spaces after
+# separators.
+
+
+def encode_default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.__dict__
+    return pydantic_encoder(value)
+
+
+def encode(value: Any, sort_keys: bool = False) -> bytes:
+    # the json module is configured to write the same bytes as orjson, so
+    # hashes of the output do not depend on whether orjson is installed
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        return orjson.dumps(value, default=encode_default, option=option)
+    return json.dumps(
+        value,
+        default=encode_default,
+        sort_keys=sort_keys,
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode()
+
+
+def dumps(value: Any, indent: Optional[int] = None) -> str:
+    # indented output always uses the json module, and matches
+    # `BaseModel.json(indent=...)`
+    if indent is None and orjson is not None:
+        return orjson.dumps(value, default=encode_default).decode()
+    return json.dumps(value, default=encode_default, indent=indent)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def parse_request(
+    data: Union[str, bytes], trusted: bool = False
+) -> OnefuzzTemplateRequest:
+    # `trusted` payloads, which have already been checked against the
+    # request's schema, are built without validation.  user field values are
+    # kept as parsed, and are checked when rendered.
+    document = loads(data)
+    if not trusted:
+        return OnefuzzTemplateRequest.parse_obj(document)
+
+    return OnefuzzTemplateRequest.construct(
+        template_name=document["template_name"],
+        user_fields=document["user_fields"],
+        containers=[
+            TaskContainers.construct(type=ContainerType(x["type"]), name=x["name"])
+            for x in document["containers"]
+        ],
+    )
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from onefuzztypes.models import Job, Task
+
+from .backend import Backend
+from .execute import execute
+from .models import OnefuzzTemplateRequest
+from .template import CompiledTemplate, RenderedTemplate
+from .usertemplates import get_compiled
+
+# the job and tasks created for a request
+Submission = Tuple[Job, List[Task]]
+
+TemplateLookup = Callable[[str], Optional[CompiledTemplate]]
+
+
+class ServiceStats(NamedTuple):
+    queued: int
+    in_flight: int
+    completed: int
+    failed: int
+
+
+class TemplateService:
+    # renders and submits requests from an asyncio application.
+    #
+    # requests wait in a queue of at most `max_queued` entries, and `submit`
+    # waits for space once it is full, so callers are slowed to the rate the
+    # backend sustains.  `concurrency` requests are processed at once: each is
+    # rendered on a thread pool, off the event loop, then submitted through
+    # the shared `backend`, with at most `backend_workers` backend calls in
+    # flight across all submissions.
+
+    def __init__(
+        self,
+        backend: Backend,
+        concurrency: int = 16,
+        max_queued: int = 256,
+        render_workers: int = 2,
+        backend_workers: int = 32,
+        templates: TemplateLookup = get_compiled,
+    ) -> None:
+        self.backend = backend
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.render_workers = render_workers
+        self.backend_workers = backend_workers
+        self.templates = templates
+
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+
+        self._queue: Optional[
+            "asyncio.Queue[Tuple[OnefuzzTemplateRequest, asyncio.Future]]"
+        ] = None
+        self._workers: List[asyncio.Task] = []
+        self._render_executor: Optional[ThreadPoolExecutor] = None
+        self._submit_executor: Optional[ThreadPoolExecutor] = None
+        self._call_executor: Optional[ThreadPoolExecutor] = None
+
+    async def start(self) -> None:
+        if self._queue is not None:
+            raise Exception("service already started")
+
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._render_executor = ThreadPoolExecutor(
+            max_workers=self.render_workers, thread_name_prefix="render"
+        )
+        # `execute` blocks a thread while its calls run on `_call_executor`
+        self._submit_executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="submit"
+        )
+        self._call_executor = ThreadPoolExecutor(
+            max_workers=self.backend_workers, thread_name_prefix="backend"
+        )
+        self._workers = [
+            asyncio.ensure_future(self._worker()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        # requests already accepted are processed before stopping
+        if self._queue is None:
+            return
+
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+        for executor in [
+            self._render_executor,
+            self._submit_executor,
+            self._call_executor,
+        ]:
+            if executor is not None:
+                executor.shutdown()
+
+        self._queue = None
+        self._workers = []
+
+    async def __aenter__(self) -> "TemplateService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args: object) -> None:
+        await self.stop()
+
+    def _accept(self) -> Tuple["asyncio.Queue", asyncio.Future]:
+        if self._queue is None:
+            raise Exception("service not started")
+        return self._queue, asyncio.get_running_loop().create_future()
+
+    async def submit(self, request: OnefuzzTemplateRequest) -> Submission:
+        queue, result = self._accept()
+        await queue.put((request, result))
+        return await result
+
+    def submit_nowait(self, request: OnefuzzTemplateRequest) -> asyncio.Future:
+        # for callers that would rather reject requests than wait for space in
+        # the queue.  raises asyncio.QueueFull once the queue is full.
+        queue, result = self._accept()
+        queue.put_nowait((request, result))
+        return result
+
+    def stats(self) -> ServiceStats:
+        return ServiceStats(
+            queued=self._queue.qsize() if self._queue is not None else 0,
+            in_flight=self.in_flight,
+            completed=self.completed,
+            failed=self.failed,
+        )
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        while True:
+            request, result = await self._queue.get()
+            self.in_flight += 1
+            try:
+                submission = await self._process(request)
+            except Exception as err:
+                self.failed += 1
+                if not result.cancelled():
+                    result.set_exception(err)
+            else:
+                self.completed += 1
+                if not result.cancelled():
+                    result.set_result(submission)
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    def _render(self, request: OnefuzzTemplateRequest) -> RenderedTemplate:
+        # templates may be built on first lookup, so this is also kept off
+        # the event loop
+        compiled = self.templates(request.template_name)
+        if compiled is None:
+            raise Exception(f"unknown template: {request.template_name}")
+        # `execute` does not modify the render, so it need not be copied
+        return compiled.render_shared(request)
+
+    async def _process(self, request: OnefuzzTemplateRequest) -> Submission:
+        loop = asyncio.get_running_loop()
+        rendered = await loop.run_in_executor(
+            self._render_executor, self._render, request
+        )
+        return await loop.run_in_executor(
+            self._submit_executor,
+            lambda: execute(
+                request, rendered, self.backend, executor=self._call_executor
+            ),
+        )
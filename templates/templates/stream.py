@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from .serialize import dumps, parse_request
+from .template import CompiledTemplate
+from .usertemplates import get_compiled as get_registered
+
+# (rendered, text): the rendered template JSON, or the error message
+RenderedLine = Tuple[bool, str]
+
+# (line number, result): the line of the input a result was rendered from
+NumberedLine = Tuple[int, RenderedLine]
+
+
+def get_compiled(name: str) -> CompiledTemplate:
+    # the registry compiles each template once per worker process
+    compiled = get_registered(name)
+    if compiled is None:
+        raise Exception(f"unknown template: {name}")
+    return compiled
+
+
+def init_worker(template_name: Optional[str]) -> None:
+    if template_name is not None:
+        get_compiled(template_name)
+
+
+def render_line(
+    line: str, template_name: Optional[str], trusted: bool = False
+) -> RenderedLine:
+    try:
+        request = parse_request(line, trusted=trusted)
+        compiled = get_compiled(template_name or request.template_name)
+        return (True, dumps(compiled.render(request)))
+    except Exception as err:
+        return (False, f"{type(err).__name__}: {err}")
+
+
+def render_chunk(
+    lines: List[str], template_name: Optional[str], trusted: bool = False
+) -> List[RenderedLine]:
+    return [render_line(x, template_name, trusted) for x in lines]
+
+
+def render_stream(
+    lines: Iterable[str],
+    template_name: Optional[str] = None,
+    workers: Optional[int] = None,
+    chunk_size: int = 64,
+    max_pending: Optional[int] = None,
+    trusted: bool = False,
+) -> Iterator[NumberedLine]:
+    # lines are rendered in chunks across a process pool.  at most
+    # `max_pending` chunks are in flight at once, and results are yielded in
+    # input order, so memory use does not grow with the size of the input.
+    #
+    # blank lines are skipped, and each result is numbered with the line of
+    # `lines` it was rendered from, counting from 1.
+    #
+    # requests are parsed with `serialize.parse_request`, without validation
+    # when `trusted`.
+    numbered = enumerate(lines, 1)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if max_pending is None:
+        max_pending = workers * 2
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(template_name,)
+    ) as executor:
+        pending: Deque[Tuple[List[int], Future]] = deque()
+        while True:
+            numbers: List[int] = []
+            chunk: List[str] = []
+            for number, line in numbered:
+                if not line.strip():
+                    continue
+                numbers.append(number)
+                chunk.append(line)
+                if len(chunk) == chunk_size:
+                    break
+            if chunk:
+                future = executor.submit(render_chunk, chunk, template_name, trusted)
+                pending.append((numbers, future))
+
+            if pending and (len(pending) >= max_pending or not chunk):
+                numbers, future = pending.popleft()
+                yield from zip(numbers, future.result())
+            elif not chunk:
+                break
+
+
+def write_stream(
+    results: Iterable[NumberedLine], output: TextIO, errors: TextIO
+) -> int:
+    failed = 0
+    for number, (rendered, text) in results:
+        if rendered:
+            output.write(text + "\n")
+        else:
+            failed += 1
+            errors.write(f"line {number}: {text}\n")
+    return failed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="render OnefuzzTemplateRequest JSON lines into OnefuzzTemplates"
+    )
+    parser.add_argument(
+        "input",
+        nargs="?",
+        type=argparse.FileType("r"),
+        default=sys.stdin,
+        help="JSONL file of requests, defaults to stdin",
+    )
+    parser.add_argument(
+        "--output",
+        type=argparse.FileType("w"),
+        default=sys.stdout,
+        help="JSONL file for rendered templates, defaults to stdout",
+    )
+    parser.add_argument(
+        "--template",
+        help="template to render every request with, rather than each "
+        "request's template_name",
+    )
+    parser.add_argument("--workers", type=int, help="defaults to the CPU count")
+    parser.add_argument("--chunk-size", type=int, default=64)
+    parser.add_argument(
+        "--max-pending",
+        type=int,
+        help="chunks in flight at once, defaults to twice the worker count",
+    )
+    parser.add_argument(
+        "--trusted",
+        action="store_true",
+        help="requests have already been validated against the request schema",
+    )
+    args = parser.parse_args()
+
+    results = render_stream(
+        args.input,
+        template_name=args.template,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        max_pending=args.max_pending,
+        trusted=args.trusted,
+    )
+    failed = write_stream(results, args.output, sys.stderr)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,55 @@
 #!/usr/bin/env python
 
+import copy
+import itertools
 import json
-from typing import Dict, List
+import threading
+import time
+from collections import OrderedDict
+from enum import Enum
+from hashlib import sha256
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from uuid import UUID
 
-from jsonpatch import apply_patch
+from jsonpatch import JsonPatchConflict
+from jsonpointer import JsonPointer, JsonPointerException
 from onefuzztypes.enums import ContainerType
+from onefuzztypes.models import JobConfig, TaskConfig
+from pydantic import BaseModel, ValidationError
+from pydantic.fields import (
+    SHAPE_DICT,
+    SHAPE_LIST,
+    SHAPE_MAPPING,
+    SHAPE_SINGLETON,
+    ModelField,
+)
+from pydantic.utils import lenient_issubclass
 
-from .enums import UserFieldType
+from .enums import UserFieldOperation, UserFieldType
 from .models import (
     TEMPLATE_USER_DATA,
     OnefuzzTemplate,
     OnefuzzTemplateConfig,
     OnefuzzTemplateField,
+    OnefuzzTemplateMatrixRequest,
+    OnefuzzTemplateNotification,
     OnefuzzTemplateRequest,
     UserField,
     TEMPLATE_BASE_FIELDS,
 )
+from .tracing import start_trace
 
 
 def template_container_types(template: OnefuzzTemplate) -> List[ContainerType]:
@@ -35,22 +69,92 @@ def build_input_config(template: OnefuzzTemplate) -> OnefuzzTemplateConfig:
     )
 
 
+def template_hash(template: OnefuzzTemplate) -> str:
+    return sha256(template.json(sort_keys=True).encode()).hexdigest()
+
+
+class InputConfig(NamedTuple):
+    config: OnefuzzTemplateConfig
+    # `config` pre-serialized, for responses that would otherwise call .json()
+    json: str
+
+
+class InputConfigCache:
+    # LRU cache of `build_input_config` results, keyed by template name and
+    # content hash.  the hash is only recomputed when a name is looked up with
+    # a different template object than last time, so templates modified in
+    # place must be dropped with `invalidate`.  the hashes of at most
+    # `maxsize` names are kept.
+    #
+    # each lookup returns its own copy of the config, so callers may modify
+    # it without affecting the cache.
+
+    def __init__(self, maxsize: int = 64) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, str], InputConfig]" = OrderedDict()
+        self._hashes: "OrderedDict[str, Tuple[OnefuzzTemplate, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str, template: OnefuzzTemplate) -> InputConfig:
+        with self._lock:
+            seen = self._hashes.get(name)
+            if seen is not None and seen[0] is template:
+                digest = seen[1]
+                self._hashes.move_to_end(name)
+            else:
+                digest = template_hash(template)
+                self._set_hash(name, template, digest)
+
+            key = (name, digest)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry._replace(config=copy_tree(entry.config))
+
+            config = build_input_config(template)
+            entry = InputConfig(config=config, json=config.json())
+            self._entries[key] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            return entry._replace(config=copy_tree(config))
+
+    def _set_hash(self, name: str, template: OnefuzzTemplate, digest: str) -> None:
+        self._hashes[name] = (template, digest)
+        self._hashes.move_to_end(name)
+        while len(self._hashes) > self.maxsize:
+            self._hashes.popitem(last=False)
+
+    def put(
+        self, name: str, template: OnefuzzTemplate, digest: str, entry: InputConfig
+    ) -> None:
+        # seeds the cache with an entry built elsewhere, such as on disk
+        with self._lock:
+            self._set_hash(name, template, digest)
+            self._entries[(name, digest)] = entry
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+                self._hashes.clear()
+                return
+
+            self._hashes.pop(name, None)
+            for key in [x for x in self._entries if x[0] == name]:
+                del self._entries[key]
+
+
+INPUT_CONFIG_CACHE = InputConfigCache()
+
+
 def build_patches(
     data: TEMPLATE_USER_DATA, field: UserField
 ) -> List[Dict[str, TEMPLATE_USER_DATA]]:
-    patches = []
-
-    if field.type == UserFieldType.Bool and not isinstance(data, bool):
-        raise Exception("invalid bool field")
-    if field.type == UserFieldType.Int and not isinstance(data, int):
-        raise Exception("invalid int field")
-    if field.type == UserFieldType.Str and not isinstance(data, str):
-        raise Exception("invalid str field")
-    if field.type == UserFieldType.DictStr and not isinstance(data, dict):
-        raise Exception("invalid DictStr field")
-    if field.type == UserFieldType.ListStr and not isinstance(data, list):
-        raise Exception("invalid ListStr field")
+    check_field_type(data, field)
 
+    patches = []
     for location in field.locations:
         patches.append(
             {
@@ -63,51 +167,908 @@ def build_patches(
     return patches
 
 
-def render(
-    request: OnefuzzTemplateRequest, template: OnefuzzTemplate
-) -> OnefuzzTemplate:
-    patches = []
-    seen = set()
+def check_field_type(data: TEMPLATE_USER_DATA, field: UserField) -> None:
+    FieldValidator(field)(data)
 
-    for name in request.user_fields:
-        for field in TEMPLATE_BASE_FIELDS + template.user_fields:
-            if field.name == name:
-                if name in seen:
-                    raise ValueError(f"duplicate specification: {name}")
-                seen.add(name)
-
-        if name not in seen:
-            raise ValueError(f"extra field: {name}")
-
-    for field in TEMPLATE_BASE_FIELDS + template.user_fields:
-        if field.name not in request.user_fields:
-            if field.required:
-                raise ValueError(f"missing required field: {field.name}")
-            else:
+
+class FieldValidator:
+    # checks user data against a field's type, including the element types of
+    # DictStr and ListStr.  when the field's locations patch enum model
+    # fields, string values must also be values of those enums.
+
+    def __init__(
+        self, field: UserField, targets: Iterable[Optional[ModelField]] = ()
+    ) -> None:
+        self.type = field.type
+        self.choices: Optional[Set[str]] = None
+        self.enums: List[str] = []
+        for target in targets:
+            if target is None or not lenient_issubclass(target.type_, Enum):
                 continue
-        patches += build_patches(request.user_fields[field.name], field)
+            values = set(x.value for x in target.type_)
+            self.choices = values if self.choices is None else self.choices & values
+            self.enums.append(target.type_.__name__)
+
+    def __call__(self, data: TEMPLATE_USER_DATA) -> None:
+        if self.type == UserFieldType.Bool:
+            if not isinstance(data, bool):
+                raise Exception("invalid bool field")
+        elif self.type == UserFieldType.Int:
+            # bool is a subclass of int, but is rendered as true or false
+            if not isinstance(data, int) or isinstance(data, bool):
+                raise Exception("invalid int field")
+        elif self.type == UserFieldType.Str:
+            if not isinstance(data, str):
+                raise Exception("invalid str field")
+            self.check_choice(data)
+        elif self.type == UserFieldType.DictStr:
+            if not isinstance(data, dict) or not all(
+                isinstance(k, str) and isinstance(v, str) for k, v in data.items()
+            ):
+                raise Exception("invalid DictStr field")
+            for value in data.values():
+                self.check_choice(value)
+        elif self.type == UserFieldType.ListStr:
+            if not isinstance(data, list) or not all(isinstance(x, str) for x in data):
+                raise Exception("invalid ListStr field")
+            for value in data:
+                self.check_choice(value)
+
+    def check_choice(self, value: str) -> None:
+        if self.choices is not None and value not in self.choices:
+            raise Exception(
+                f"invalid {'/'.join(self.enums)} value: {value} "
+                f"(expected one of: {', '.join(sorted(self.choices))})"
+            )
+
+
+# (task index, container index, container type) of an unnamed task container
+ContainerSlot = Tuple[int, int, ContainerType]
+
+
+class PatchOp(NamedTuple):
+    op: UserFieldOperation
+    path: str
+    pointer: JsonPointer
+    # the pydantic field the patched value lands in, if it can be determined
+    # from the template's model types
+    target: Optional[ModelField]
+
+
+class CompiledField(NamedTuple):
+    field: UserField
+    ops: List[PatchOp]
+
+
+def resolve_target(pointer: JsonPointer) -> Optional[ModelField]:
+    node: Any = OnefuzzTemplate
+    target = None
+    for part in pointer.parts:
+        if isinstance(node, ModelField):
+            # indexing into a List or Dict field selects the element field
+            if node.shape == SHAPE_SINGLETON or not node.sub_fields:
+                return None
+            target = node.sub_fields[0]
+        elif part in node.__fields__:
+            target = node.__fields__[part]
+        else:
+            return None
+
+        node = target
+        if target.shape == SHAPE_SINGLETON and lenient_issubclass(
+            target.type_, BaseModel
+        ):
+            node = target.type_
+
+    return target
+
+
+IMMUTABLE = (str, int, float, Enum, UUID)
+
+
+def copy_node(node: Any) -> Any:
+    if isinstance(node, BaseModel):
+        return copy_model(node)
+    if isinstance(node, list):
+        return list(node)
+    if isinstance(node, dict):
+        return dict(node)
+    raise JsonPointerException(f"unable to copy {type(node)}")
+
+
+def copy_model(node: BaseModel) -> BaseModel:
+    # a shallow copy, as with `BaseModel.copy`, except that the set of fields
+    # set is shared with `node` until `set_child` sets a field outside of it
+    if node.__private_attributes__:
+        return node.copy()
+    model = node.__class__.__new__(node.__class__)
+    object.__setattr__(model, "__dict__", dict(node.__dict__))
+    object.__setattr__(model, "__fields_set__", node.__fields_set__)
+    return model
 
-    raw = json.loads(template.json())
-    updated = apply_patch(raw, patches)
-    rendered = OnefuzzTemplate.parse_obj(updated)
 
-    used_containers = []
-    for task in rendered.tasks:
-        for task_container in task.containers:
-            if task_container.name:
+def copy_tree(node: Any) -> Any:
+    # a deep copy sharing only immutable values, much faster than
+    # `BaseModel.copy(deep=True)`.  other values, such as the dataclasses
+    # holding secrets, fall back to `copy.deepcopy`.
+    cls = node.__class__
+    copiers = FIELD_COPIERS.get(cls)
+    if copiers is None:
+        if node is None or isinstance(node, IMMUTABLE):
+            return node
+        if cls is list:
+            return [copy_tree(x) for x in node]
+        if cls is dict:
+            return {k: copy_tree(v) for k, v in node.items()}
+        if not isinstance(node, BaseModel):
+            return copy.deepcopy(node)
+        if node.__private_attributes__:
+            return node.copy(deep=True)
+        copiers = field_copiers(cls)
+
+    values = dict(node.__dict__)
+    for name, copier in copiers:
+        value = values.get(name)
+        if value is not None:
+            values[name] = copier(value)
+    model = cls.__new__(cls)
+    object.__setattr__(model, "__dict__", values)
+    object.__setattr__(model, "__fields_set__", set(node.__fields_set__))
+    return model
+
+
+def copy_rendered(tree: OnefuzzTemplate) -> OnefuzzTemplate:
+    # as `copy_tree`, except that the entries of `user_fields`, which renders
+    # never patch and make up most of a large template, are shared with the
+    # template.  callers must not modify them.
+    values = dict(tree.__dict__)
+    for name, value in values.items():
+        if name == "user_fields":
+            values[name] = list(value)
+        else:
+            values[name] = copy_tree(value)
+    model = OnefuzzTemplate.__new__(OnefuzzTemplate)
+    object.__setattr__(model, "__dict__", values)
+    object.__setattr__(model, "__fields_set__", set(tree.__fields_set__))
+    return model
+
+
+# per model class, the fields `copy_tree` must copy and how.  filled in
+# lazily, where a race between threads only builds the same entry twice.
+FIELD_COPIERS: Dict[type, List[Tuple[str, Callable[[Any], Any]]]] = {}
+
+
+def field_copiers(model: type) -> List[Tuple[str, Callable[[Any], Any]]]:
+    copiers = []
+    for name, field in model.__fields__.items():
+        # fields of, or holding only, immutable values (including lists and
+        # dicts of strings) need a copy of at most their container
+        flat = all(
+            x.shape == SHAPE_SINGLETON and not x.sub_fields
+            for x in field.sub_fields or []
+        )
+        immutable = flat and lenient_issubclass(field.type_, IMMUTABLE)
+        if field.shape == SHAPE_SINGLETON and immutable:
+            continue
+        if field.shape == SHAPE_LIST and immutable:
+            copiers.append((name, list))
+        elif field.shape in (SHAPE_DICT, SHAPE_MAPPING) and immutable:
+            copiers.append((name, dict))
+        else:
+            copiers.append((name, copy_tree))
+    FIELD_COPIERS[model] = copiers
+    return copiers
+
+
+def get_part(node: Any, part: str) -> Any:
+    if isinstance(node, BaseModel):
+        if part not in node.__fields__:
+            raise JsonPointerException(f"member '{part}' not found in {node}")
+        return part
+    return JsonPointer.get_part(node, part)
+
+
+def get_child(node: Any, part: Any) -> Any:
+    if isinstance(node, BaseModel):
+        return getattr(node, part)
+    try:
+        return node[part]
+    except (IndexError, KeyError, TypeError):
+        raise JsonPointerException(f"member '{part}' not found in {node}")
+
+
+def set_child(node: Any, part: Any, value: Any) -> None:
+    if isinstance(node, BaseModel):
+        if part not in node.__fields_set__:
+            object.__setattr__(node, "__fields_set__", node.__fields_set__ | {part})
+        node.__dict__[part] = value
+    else:
+        node[part] = value
+
+
+def apply_op(subobj: Any, part: Any, op: PatchOp, value: Any) -> None:
+    # equivalent to the jsonpatch `add` and `replace` operations
+    if isinstance(subobj, list):
+        if op.op == UserFieldOperation.replace:
+            if part == "-" or part >= len(subobj) or part < 0:
+                raise JsonPatchConflict("can't replace outside of list")
+            subobj[part] = value
+        elif part == "-":
+            subobj.append(value)
+        elif part > len(subobj) or part < 0:
+            raise JsonPatchConflict("can't insert outside of list")
+        else:
+            subobj.insert(part, value)
+    elif isinstance(subobj, dict):
+        if op.op == UserFieldOperation.replace and part not in subobj:
+            raise JsonPatchConflict(f"can't replace a non-existent object '{part}'")
+        subobj[part] = value
+    elif isinstance(subobj, BaseModel):
+        # `get_part` has already verified the field exists
+        set_child(subobj, part, value)
+    else:
+        raise JsonPatchConflict(
+            f"unable to fully resolve json pointer {op.path}, part {part}"
+        )
+
+
+def patch_tree(
+    root: Any, ops: List[Tuple[PatchOp, Any]], validate: bool = False
+) -> Any:
+    # copy-on-write: only the nodes on the path to a patched value are copied,
+    # every other subtree is shared with `root`
+    root = copy_node(root)
+    copied = {id(root)}
+
+    for op, value in ops:
+        parts = op.pointer.parts
+        if not parts:
+            raise JsonPatchConflict(f"unable to patch document root: {op.path}")
+
+        node = root
+        for part in parts[:-1]:
+            part = get_part(node, part)
+            child = get_child(node, part)
+            if id(child) not in copied:
+                child = copy_node(child)
+                copied.add(id(child))
+                set_child(node, part, child)
+            node = child
+
+        part = get_part(node, parts[-1])
+        if validate:
+            value = validate_value(op, value)
+        apply_op(node, part, op, value)
+
+    return root
+
+
+def validate_value(op: PatchOp, value: Any) -> Any:
+    if op.target is None:
+        raise Exception(f"unable to validate {op.path}")
+    validated, errors = op.target.validate(value, {}, loc=op.path)
+    if errors:
+        raise ValidationError([errors], OnefuzzTemplate)
+    return validated
+
+
+class CompiledTemplate:
+    # compiled templates are shared, such as by the registry and
+    # `TemplateService`, and may be rendered from several threads at once.
+    # once built, rendering only reads `template`, `document`, `fields` and
+    # `validators`, and patches copies of the nodes it changes.  `slot_ops`
+    # and `hash` are filled in lazily by replacing them whole, so a race
+    # between threads only builds the same value twice.
+
+    def __init__(self, template: OnefuzzTemplate) -> None:
+        self.template = template
+        self.document = json.loads(template.json())
+
+        # fields are kept in evaluation order, which matches the order patches
+        # were generated in by `build_patches`
+        self.fields: Dict[str, CompiledField] = {}
+        for field in TEMPLATE_BASE_FIELDS + template.user_fields:
+            ops = [
+                PatchOp(op=x.op, path=x.path, pointer=JsonPointer(x.path), target=None)
+                for x in field.locations
+            ]
+            self.fields[field.name] = CompiledField(field=field, ops=ops)
+
+        self.slot_ops: Dict[Tuple[int, int], PatchOp] = {}
+        self._hash: Optional[str] = None
+        # set by `analyzer.trust_template` once every location is known to
+        # patch cleanly, and no location can affect the root validators
+        self.trusted = False
+        self.resolve_targets()
+
+    def resolve_targets(self) -> None:
+        for compiled in self.fields.values():
+            compiled.ops[:] = [
+                x._replace(target=resolve_target(x.pointer)) for x in compiled.ops
+            ]
+
+        # user data is checked before any patching, so bad requests fail
+        # without building any models
+        self.validators = {
+            name: FieldValidator(x.field, [op.target for op in x.ops])
+            for name, x in self.fields.items()
+        }
+
+        # patching paths that do not resolve to a model field, such as adding
+        # keys pydantic ignores, can only be rendered through `parse_obj`
+        self.strict_only = any(
+            op.target is None for x in self.fields.values() for op in x.ops
+        )
+
+    @property
+    def hash(self) -> str:
+        if self._hash is None:
+            self._hash = template_hash(self.template)
+        return self._hash
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # pydantic fields can not be pickled, they are resolved again on load
+        state = dict(self.__dict__)
+        state["fields"] = {
+            name: x._replace(ops=[op._replace(target=None) for op in x.ops])
+            for name, x in self.fields.items()
+        }
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.resolve_targets()
+
+    def build_ops(
+        self, request: OnefuzzTemplateRequest
+    ) -> List[Tuple[PatchOp, TEMPLATE_USER_DATA]]:
+        for name in request.user_fields:
+            if name not in self.fields:
+                raise ValueError(f"extra field: {name}")
+
+        ops = []
+        for name, compiled in self.fields.items():
+            if name not in request.user_fields:
+                if compiled.field.required:
+                    raise ValueError(f"missing required field: {name}")
                 continue
 
-            for entry in request.containers:
-                if entry.type != task_container.type:
-                    continue
-                task_container.name = entry.name
-                used_containers.append(entry)
+            value = request.user_fields[name]
+            self.validators[name](value)
+            for op in compiled.ops:
+                ops.append((op, value))
+        return ops
+
+    def render(
+        self, request: OnefuzzTemplateRequest, strict: bool = False
+    ) -> OnefuzzTemplate:
+        return self.render_tree(request, strict=strict, independent=True)[0]
+
+    def render_shared(
+        self, request: OnefuzzTemplateRequest, strict: bool = False
+    ) -> "RenderedTemplate":
+        return RenderedTemplate(self, self.render_tree(request, strict=strict)[0])
+
+    def render_matrix(
+        self, request: OnefuzzTemplateMatrixRequest
+    ) -> Iterator[OnefuzzTemplate]:
+        # each matrix value is checked once, and the first combination is
+        # rendered in full.  when the matrix fields can be patched onto a
+        # previous render, each later combination only patches the fields
+        # whose value changed, sharing everything else (including the bound
+        # containers) with the previous render.  like `render`, each
+        # combination is returned as a copy sharing only `user_fields` with
+        # the template.
+        for name, values in request.matrix.items():
+            if name not in self.fields:
+                raise ValueError(f"extra field: {name}")
+            for value in values:
+                self.validators[name](value)
+
+        names = list(request.matrix)
+        combinations = itertools.product(*request.matrix.values())
+        previous = next(combinations)
+        tree, _ = self.render_tree(matrix_request(request, names, previous))
+        yield self.finish(tree)
+
+        incremental = independent_fields(self)
+        if self.strict_only or any(x not in incremental for x in names):
+            for values in combinations:
+                yield self.render(matrix_request(request, names, values))
+            return
+
+        for values in combinations:
+            trace = start_trace("render_matrix")
+            ops = [
+                (op, value)
+                for name, value, old in zip(names, values, previous)
+                if not same_value(value, old)
+                for op in self.fields[name].ops
+            ]
+            trace.count("patches", len(ops))
+            try:
+                tree = patch_tree(tree, ops, validate=True)
+                trace.stage("patch")
+                self.check(tree)
+                trace.stage("validate")
+            except Exception as err:
+                trace.finish(error=err)
+                raise
+            trace.finish()
+            previous = values
+            yield self.finish(tree)
 
-            if not task_container.name:
-                raise Exception(f"missing container definition {task_container.type}")
+    def render_tree(
+        self,
+        request: OnefuzzTemplateRequest,
+        strict: bool = False,
+        independent: bool = False,
+    ) -> Tuple[OnefuzzTemplate, List[ContainerSlot]]:
+        # renders the request, returning the rendered template before
+        # `finish`, along with the container slots that were bound.  with
+        # `independent`, the result shares nothing with the template, as after
+        # `finish`.
+        trace = start_trace("render")
+        try:
+            ops = self.build_ops(request)
+            trace.stage("fields")
+            trace.count("patches", len(ops))
 
+            # trees parsed from a patched copy of `document` share nothing
+            # with the template
+            fresh = strict or self.strict_only
+            if fresh:
+                document = patch_tree(self.document, ops)
+                trace.stage("patch")
+                tree = OnefuzzTemplate.parse_obj(document)
+            else:
+                tree = patch_tree(self.template, ops, validate=True)
+                trace.stage("patch")
+                self.check(tree)
+            trace.stage("validate")
+
+            slots = container_slots(tree)
+            names = container_names(request, slots)
+            if independent and not fresh:
+                tree = copy_rendered(tree)
+                trace.stage("copy")
+            if slots:
+                bind_containers(tree, slots, names, in_place=independent or fresh)
+            trace.stage("bind")
+            trace.count("bound_containers", len(slots))
+        except Exception as err:
+            trace.finish(error=err)
+            raise
+        trace.finish()
+        return tree, slots
+
+    def check(self, tree: OnefuzzTemplate) -> None:
+        if self.trusted:
+            return
+        for _, validator in OnefuzzTemplate.__post_root_validators__:
+            validator(OnefuzzTemplate, tree.__dict__)
+
+    def binding_ops(
+        self, slots: List[ContainerSlot], names: Dict[ContainerType, str]
+    ) -> List[Tuple[PatchOp, Any]]:
+        slot_ops = self.slot_ops
+        added: Dict[Tuple[int, int], PatchOp] = {}
+        ops = []
+        for task_idx, container_idx, container_type in slots:
+            key = (task_idx, container_idx)
+            op = slot_ops.get(key)
+            if op is None:
+                path = f"/tasks/{task_idx}/containers/{container_idx}/name"
+                pointer = JsonPointer(path)
+                op = PatchOp(
+                    op=UserFieldOperation.replace,
+                    path=path,
+                    pointer=pointer,
+                    target=resolve_target(pointer),
+                )
+                added[key] = op
+            ops.append((op, names[container_type]))
+
+        # never modified in place, as other threads may be reading or pickling
+        # the current mapping
+        if added:
+            self.slot_ops = {**slot_ops, **added}
+        return ops
+
+    def finish(self, tree: OnefuzzTemplate) -> OnefuzzTemplate:
+        # `tree` shares its unpatched subtrees with the template, so rendered
+        # templates are copied before callers, who may update them, can see
+        # them.  only `render_shared` shares more than `user_fields`.
+        return copy_rendered(tree)
+
+
+def compile_template(template: OnefuzzTemplate) -> CompiledTemplate:
+    return CompiledTemplate(template)
+
+
+class RenderedTemplate:
+    # a rendered template that only holds the nodes on the paths it patched,
+    # sharing every other subtree with the compiled template (and other
+    # renders of it).  the shared tree is never handed out: `job`, `tasks`,
+    # `notifications` and `to_model` return copies, which callers may
+    # modify, while `json` serializes without copying.
+
+    __slots__ = ("compiled", "_tree")
+
+    compiled: CompiledTemplate
+    _tree: OnefuzzTemplate
+
+    def __init__(self, compiled: CompiledTemplate, tree: OnefuzzTemplate) -> None:
+        object.__setattr__(self, "compiled", compiled)
+        object.__setattr__(self, "_tree", tree)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("RenderedTemplate can not be modified")
+
+    @property
+    def job(self) -> JobConfig:
+        return copy_tree(self._tree.job)
+
+    @property
+    def tasks(self) -> Tuple[TaskConfig, ...]:
+        return tuple(copy_tree(x) for x in self._tree.tasks)
+
+    @property
+    def notifications(self) -> Tuple[OnefuzzTemplateNotification, ...]:
+        return tuple(copy_tree(x) for x in self._tree.notifications)
+
+    def json(self, **kwargs: Any) -> str:
+        return self._tree.json(**kwargs)
+
+    def to_model(self) -> OnefuzzTemplate:
+        return self.compiled.finish(self._tree)
+
+
+# either form of rendered template, as accepted by `execute`
+Rendered = Union[OnefuzzTemplate, RenderedTemplate]
+
+
+def matrix_request(
+    request: OnefuzzTemplateMatrixRequest,
+    names: List[str],
+    values: Iterable[TEMPLATE_USER_DATA],
+) -> OnefuzzTemplateRequest:
+    # the matrix request has already been validated
+    user_fields = dict(request.user_fields)
+    user_fields.update(zip(names, values))
+    return OnefuzzTemplateRequest.construct(
+        template_name=request.template_name,
+        user_fields=user_fields,
+        containers=request.containers,
+    )
+
+
+def expand_matrix(
+    request: OnefuzzTemplateMatrixRequest,
+) -> Iterator[OnefuzzTemplateRequest]:
+    names = list(request.matrix)
+    for values in itertools.product(*request.matrix.values()):
+        yield matrix_request(request, names, values)
+
+
+def container_slots(rendered: OnefuzzTemplate) -> List[ContainerSlot]:
+    return [
+        (task_idx, container_idx, container.type)
+        for task_idx, task in enumerate(rendered.tasks)
+        for container_idx, container in enumerate(task.containers)
+        if not container.name
+    ]
+
+
+def bind_containers(
+    tree: OnefuzzTemplate,
+    slots: List[ContainerSlot],
+    names: Dict[ContainerType, str],
+    in_place: bool = False,
+) -> None:
+    # names every slot directly, rather than through `patch_tree`, as full
+    # renders bind every slot.  `tree` must be a new root.  unless it shares
+    # nothing with the template (`in_place`), each task and container bound
+    # is copied first.
+    if in_place:
+        for task_idx, container_idx, container_type in slots:
+            container = tree.tasks[task_idx].containers[container_idx]
+            set_child(container, "name", names[container_type])
+        return
+
+    tasks = list(tree.tasks)
+    task_idx = -1
+    for slot_task, container_idx, container_type in slots:
+        if slot_task != task_idx:
+            task_idx = slot_task
+            task = copy_model(tasks[task_idx])
+            containers = list(task.containers)
+            set_child(task, "containers", containers)
+            tasks[task_idx] = task
+
+        container = copy_model(containers[container_idx])
+        set_child(container, "name", names[container_type])
+        containers[container_idx] = container
+    set_child(tree, "tasks", tasks)
+
+
+def container_names(
+    request: OnefuzzTemplateRequest, slots: List[ContainerSlot]
+) -> Dict[ContainerType, str]:
+    # every requested container of a type used by a slot is used, and the last
+    # one specified provides the name
+    names = {entry.type: entry.name for entry in request.containers}
+
+    for _, _, container_type in slots:
+        if not names.get(container_type):
+            raise Exception(f"missing container definition {container_type}")
+
+    used_types = set(x[2] for x in slots)
     for entry in request.containers:
-        if entry not in used_containers:
+        if entry.type not in used_types:
             raise Exception(f"unused container in request: {entry}")
 
-    return rendered
+    return names
+
+
+class IncrementalRenderer:
+    # renders a series of similar requests, such as the preview of a form as it
+    # is filled in.  fields and containers that are unchanged since the
+    # previous request are not patched or validated again.  output is
+    # identical to `CompiledTemplate.render`.
+    #
+    # changes that can not be applied on top of the previous render, such as
+    # removing a field or patching a path another field patches within, fall
+    # back to a full render.
+    #
+    # unlike `CompiledTemplate`, it holds the previous request and render, so
+    # it must not be shared between threads.
+
+    def __init__(self, compiled: CompiledTemplate) -> None:
+        self.compiled = compiled
+        self.request: Optional[OnefuzzTemplateRequest] = None
+        self.tree: Optional[OnefuzzTemplate] = None
+        self.slots: List[ContainerSlot] = []
+        self.names: Dict[ContainerType, str] = {}
+
+        self.incremental_fields = independent_fields(compiled)
+
+    def render(self, request: OnefuzzTemplateRequest) -> OnefuzzTemplate:
+        if self.tree is None or self.request is None or self.compiled.strict_only:
+            return self.full_render(request)
+
+        # errors are detected the same way as in a full render
+        self.compiled.build_ops(request)
+
+        previous = self.request.user_fields
+        if any(x not in request.user_fields for x in previous):
+            return self.full_render(request)
+
+        changed = [
+            name
+            for name in self.compiled.fields
+            if name in request.user_fields
+            and not same_value(previous.get(name), request.user_fields[name])
+        ]
+        if any(x not in self.incremental_fields for x in changed):
+            return self.full_render(request)
+
+        trace = start_trace("render_incremental")
+        try:
+            tree = self.tree
+            ops = [
+                (op, request.user_fields[name])
+                for name in changed
+                for op in self.compiled.fields[name].ops
+            ]
+            trace.count("patches", len(ops))
+            if ops:
+                tree = patch_tree(tree, ops, validate=True)
+                trace.stage("patch")
+                self.compiled.check(tree)
+                trace.stage("validate")
+
+            names = container_names(request, self.slots)
+            rebind = [x for x in self.slots if names[x[2]] != self.names[x[2]]]
+            if rebind:
+                tree = patch_tree(tree, self.compiled.binding_ops(rebind, names))
+            trace.stage("bind")
+            trace.count("bound_containers", len(rebind))
+        except Exception as err:
+            trace.finish(error=err)
+            raise
+        trace.finish()
+
+        self.remember(request, tree, self.slots, names)
+        return self.compiled.finish(tree)
+
+    def full_render(self, request: OnefuzzTemplateRequest) -> OnefuzzTemplate:
+        tree, slots = self.compiled.render_tree(request)
+        self.remember(request, tree, slots, container_names(request, slots))
+        return self.compiled.finish(tree)
+
+    def remember(
+        self,
+        request: OnefuzzTemplateRequest,
+        tree: OnefuzzTemplate,
+        slots: List[ContainerSlot],
+        names: Dict[ContainerType, str],
+    ) -> None:
+        # the request is copied, as callers may reuse and modify it
+        self.request = request.copy(deep=True)
+        self.tree = tree
+        self.slots = slots
+        self.names = names
+
+
+def independent_fields(compiled: CompiledTemplate) -> Set[str]:
+    # fields whose value can be changed by patching a previous render
+    paths = [op.pointer.parts for x in compiled.fields.values() for op in x.ops]
+    return set(
+        name
+        for name, x in compiled.fields.items()
+        if all(is_independent(op, paths) for op in x.ops)
+    )
+
+
+def is_independent(op: PatchOp, paths: List[List[str]]) -> bool:
+    # whether `op` can be re-applied on its own to a previous render
+    parts = op.pointer.parts
+
+    # inserting into a list moves the entries after it
+    if op.op == UserFieldOperation.add and (parts[-1] == "-" or parts[-1].isdigit()):
+        return False
+
+    # container names decide which containers are bound from the request
+    if parts[0] == "tasks" and (len(parts) < 3 or parts[2] == "containers"):
+        return False
+
+    # no other location may patch within, or above, this one
+    for other in paths:
+        if other is parts:
+            continue
+        size = min(len(other), len(parts))
+        if other[:size] == parts[:size]:
+            return False
+
+    return True
+
+
+def same_value(first: Any, second: Any) -> bool:
+    # True == 1, but they are rendered differently
+    return type(first) is type(second) and first == second
+
+
+def canonical_request(request: OnefuzzTemplateRequest) -> OnefuzzTemplateRequest:
+    # requests that render identically have the same canonical form,
+    # regardless of the order of `user_fields` and of containers of different
+    # types.  the order of containers of the same type is kept, as the last
+    # one names the slot.
+    return OnefuzzTemplateRequest.construct(
+        template_name=request.template_name,
+        user_fields={x: request.user_fields[x] for x in sorted(request.user_fields)},
+        containers=sorted(request.containers, key=lambda x: x.type.value),
+    )
+
+
+def request_hash(request: OnefuzzTemplateRequest) -> str:
+    # the hash of the canonical request.  `template_name` is not included, as
+    # rendering does not use it.
+    canonical = canonical_request(request)
+    data = {
+        "user_fields": canonical.user_fields,
+        "containers": [[x.type.value, x.name] for x in canonical.containers],
+    }
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return sha256(encoded.encode()).hexdigest()
+
+
+class RenderCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    size: int
+
+
+class RenderCache:
+    # bounded LRU cache of rendered templates, keyed by template and request
+    # hash, with an optional time to live in seconds.
+    #
+    # entries share their unpatched subtrees with the template, and are never
+    # returned: like `render`, each lookup returns a copy made by `finish`,
+    # whose job, tasks and notifications callers may modify without affecting
+    # later lookups or the template.  failed renders are not cached.
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[OnefuzzTemplate, float]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def render(
+        self, compiled: CompiledTemplate, request: OnefuzzTemplateRequest
+    ) -> OnefuzzTemplate:
+        key = (compiled.hash, request_hash(request))
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] < now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled.finish(entry[0])
+            self.misses += 1
+
+        tree, _ = compiled.render_tree(request)
+
+        expires = now + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (tree, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+        return compiled.finish(tree)
+
+    def stats(self) -> RenderCacheStats:
+        with self._lock:
+            return RenderCacheStats(
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+                expirations=self.expirations,
+                size=len(self._entries),
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+def render(
+    request: OnefuzzTemplateRequest, template: OnefuzzTemplate, strict: bool = False
+) -> OnefuzzTemplate:
+    return compile_template(template).render(request, strict=strict)
+
+
+def render_shared(
+    request: OnefuzzTemplateRequest, template: OnefuzzTemplate, strict: bool = False
+) -> RenderedTemplate:
+    return compile_template(template).render_shared(request, strict=strict)
+
+
+def render_matrix(
+    request: OnefuzzTemplateMatrixRequest, template: OnefuzzTemplate
+) -> Iterator[OnefuzzTemplate]:
+    return compile_template(template).render_matrix(request)
+
+
+def render_many(
+    requests: Iterable[OnefuzzTemplateRequest],
+    template: OnefuzzTemplate,
+    strict: bool = False,
+) -> List[Union[OnefuzzTemplate, Exception]]:
+    # the template is compiled once for the whole batch.  a failing request
+    # does not stop the batch, its exception is returned in its place
+    compiled = compile_template(template)
+
+    results: List[Union[OnefuzzTemplate, Exception]] = []
+    for request in requests:
+        try:
+            results.append(compiled.render(request, strict=strict))
+        except Exception as err:
+            results.append(err)
+    return results
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+import logging
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from onefuzztypes.models import (
+    Job,
+    JobConfig,
+    Notification,
+    NotificationConfig,
+    Task,
+    TaskConfig,
+)
+from onefuzztypes.primitives import Container
+
+from .backend import Backend
+
+T = TypeVar("T")
+
+
+class Trace:
+    # timings, in seconds, and counts recorded for one instrumented call.
+    # `allocated_blocks` is the change in the interpreter's allocated memory
+    # blocks over the call.
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.stages: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.duration = 0.0
+        self.error: Optional[str] = None
+        self._start = self._last = time.perf_counter()
+        self._blocks = sys.getallocatedblocks()
+
+    def stage(self, name: str) -> None:
+        # attributes the time since the previous stage to `name`
+        now = time.perf_counter()
+        self.stages[name] = self.stages.get(name, 0.0) + now - self._last
+        self._last = now
+
+    def count(self, name: str, value: int) -> None:
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.duration = time.perf_counter() - self._start
+        self.counts["allocated_blocks"] = sys.getallocatedblocks() - self._blocks
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        for sink in SINKS:
+            sink(self)
+
+
+class NullTrace(Trace):
+    # used while no sinks are registered, so instrumented code does not need
+    # to check whether tracing is enabled
+
+    def __init__(self) -> None:
+        pass
+
+    def stage(self, name: str) -> None:
+        pass
+
+    def count(self, name: str, value: int) -> None:
+        pass
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+
+TraceSink = Callable[[Trace], None]
+
+SINKS: List[TraceSink] = []
+NULL_TRACE = NullTrace()
+
+
+def add_sink(sink: TraceSink) -> None:
+    SINKS.append(sink)
+
+
+def remove_sink(sink: TraceSink) -> None:
+    SINKS.remove(sink)
+
+
+def start_trace(name: str) -> Trace:
+    if not SINKS:
+        return NULL_TRACE
+    return Trace(name)
+
+
+class LoggingSink:
+    def __init__(
+        self, logger: Optional[logging.Logger] = None, level: int = logging.DEBUG
+    ) -> None:
+        self.logger = logger or logging.getLogger("templates.tracing")
+        self.level = level
+
+    def __call__(self, trace: Trace) -> None:
+        stages = " ".join(f"{k}={v * 1000:.3f}ms" for k, v in trace.stages.items())
+        counts = " ".join(f"{k}={v}" for k, v in trace.counts.items())
+        self.logger.log(
+            self.level,
+            "%s %.3fms %s %s%s",
+            trace.name,
+            trace.duration * 1000,
+            stages,
+            counts,
+            f" error={trace.error}" if trace.error else "",
+        )
+
+
+class HistogramSink:
+    # keeps the most recent `maxlen` durations of each trace and stage, and
+    # running totals of counts
+
+    def __init__(self, maxlen: int = 10000) -> None:
+        self.maxlen = maxlen
+        self.durations: Dict[Tuple[str, str], Deque[float]] = {}
+        self.counts: Dict[Tuple[str, str], int] = {}
+        self.errors: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, trace: Trace) -> None:
+        with self._lock:
+            for stage, duration in [("total", trace.duration)] + list(
+                trace.stages.items()
+            ):
+                key = (trace.name, stage)
+                if key not in self.durations:
+                    self.durations[key] = deque(maxlen=self.maxlen)
+                self.durations[key].append(duration)
+            for name, value in trace.counts.items():
+                key = (trace.name, name)
+                self.counts[key] = self.counts.get(key, 0) + value
+            if trace.error:
+                self.errors[trace.name] = self.errors.get(trace.name, 0) + 1
+
+    def percentile(self, name: str, stage: str, pct: float) -> float:
+        with self._lock:
+            ordered = sorted(self.durations.get((name, stage), []))
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for name, stage in list(self.durations):
+            values = self.durations[(name, stage)]
+            result[f"{name}.{stage}"] = {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "p50": self.percentile(name, stage, 50),
+                "p99": self.percentile(name, stage, 99),
+            }
+        return result
+
+
+class TracedBackend(Backend):
+    # records a trace named `backend.<method>` for each call to `backend`
+
+    def __init__(self, backend: Backend) -> None:
+        self.backend = backend
+
+    def _call(self, name: str, func: Callable[..., T], *args: Any) -> T:
+        trace = start_trace(f"backend.{name}")
+        try:
+            result = func(*args)
+        except Exception as err:
+            trace.stage("call")
+            trace.finish(error=err)
+            raise
+        trace.stage("call")
+        trace.finish()
+        return result
+
+    def create_notification(
+        self, container: Container, config: NotificationConfig
+    ) -> Notification:
+        return self._call(
+            "create_notification", self.backend.create_notification, container, config
+        )
+
+    def create_job(self, config: JobConfig) -> Job:
+        return self._call("create_job", self.backend.create_job, config)
+
+    def create_task(self, config: TaskConfig) -> Task:
+        return self._call("create_task", self.backend.create_task, config)
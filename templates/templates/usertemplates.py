@@ -12,9 +12,13 @@ from onefuzztypes.models import (
 
 from .enums import UserFieldOperation, UserFieldType
 from .models import OnefuzzTemplate, UserField, UserFieldLocation
+from .diskcache import DiskCache, default_cache_dir
+from .registry import TemplateRegistry, TemplateSource
+from .template import INPUT_CONFIG_CACHE, CompiledTemplate, InputConfig
 
-TEMPLATES = {
-    "afl_basic": OnefuzzTemplate(
+
+def afl_basic() -> OnefuzzTemplate:
+    return OnefuzzTemplate(
         job=JobConfig(project="", name="", build="", duration=1),
         tasks=[
             TaskConfig(
@@ -236,8 +240,11 @@ TEMPLATES = {
                 ],
             ),
         ],
-    ),
-    "libfuzzer_basic": OnefuzzTemplate(
+    )
+
+
+def libfuzzer_basic() -> OnefuzzTemplate:
+    return OnefuzzTemplate(
         job=JobConfig(project="", name="", build="", duration=1),
         tasks=[
             TaskConfig(
@@ -469,9 +476,42 @@ TEMPLATES = {
                 ],
             ),
         ],
-    ),
-}
+    )
+
+
+def template_cache() -> Optional[DiskCache]:
+    root = default_cache_dir()
+    if root is None:
+        return None
+    return DiskCache(root, [__file__])
+
+
+TEMPLATES = TemplateRegistry(disk_cache=template_cache())
+TEMPLATES.register("afl_basic", afl_basic, cache=True)
+TEMPLATES.register("libfuzzer_basic", libfuzzer_basic, cache=True)
 
 
 def get_template(name: str) -> Optional[OnefuzzTemplate]:
     return TEMPLATES.get(name)
+
+
+def get_compiled(name: str) -> Optional[CompiledTemplate]:
+    if name not in TEMPLATES:
+        return None
+    return TEMPLATES.compiled(name)
+
+
+def get_input_config(name: str) -> Optional[InputConfig]:
+    template = get_template(name)
+    if template is None:
+        return None
+    return INPUT_CONFIG_CACHE.get(name, template)
+
+
+def register_template(name: str, source: TemplateSource) -> None:
+    TEMPLATES.register(name, source)
+
+
+def invalidate_template(name: Optional[str] = None) -> None:
+    # must be called after modifying a registered template in place
+    TEMPLATES.invalidate(name)